@@ -2,6 +2,7 @@ import os
 import sqlite3
 from datetime import timedelta
 from flask import Flask, request, current_app
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import LoginManager, current_user
 
@@ -15,6 +16,9 @@ login_manager = LoginManager()
 # We can set the login view here, which is the endpoint name for the login route.
 socketio = SocketIO()
 
+# Session user lookup, run on every authenticated request.
+LOAD_USER_SQL = "SELECT id, email, role FROM usuarios WHERE id = ?"
+
 # --- Database Helper ---
 def get_conn():
     """
@@ -36,10 +40,32 @@ def create_app(config_class=Config):
     # Load configuration from the provided config class object.
     app.config.from_object(config_class)
 
+    # Behind reverse proxies, take the client address and scheme from their headers.
+    trusted_proxies = app.config['TRUSTED_PROXIES']
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies,
+                                x_host=trusted_proxies)
+
     # --- Initialize Extensions ---
     # Bind the extension instances to the created app.
     login_manager.init_app(app)
     socketio.init_app(app)
+    from . import nlp_utils, vector_db
+    nlp_utils.init_app(app)
+    vector_db.init_app(app)
+    from .search_cache import search_cache
+    search_cache.init_app(app)
+    from .display_cache import display_cache
+    display_cache.init_app(app)
+    from .http_client import http_client
+    http_client.init_app(app)
+    from .gateway_cache import gateway_cache
+    gateway_cache.init_app(app)
+    from .documents import document_indexer
+    document_indexer.init_app(app)
+    from .security import password_hasher, login_limiter
+    password_hasher.init_app(app)
+    login_limiter.init_app(app)
 
     # --- User Loader for Flask-Login ---
     from .models import User
@@ -52,7 +78,7 @@ def create_app(config_class=Config):
         # We need an app context to connect to the database.
         with app.app_context():
             conn = get_conn()
-            user_data = conn.execute("SELECT id, email, role FROM usuarios WHERE id = ?", (user_id,)).fetchone()
+            user_data = conn.execute(LOAD_USER_SQL, (user_id,)).fetchone()
             conn.close()
             if user_data:
                 return User(id=user_data['id'], email=user_data['email'], role=user_data['role'])
@@ -62,10 +88,11 @@ def create_app(config_class=Config):
     login_manager.login_view = 'auth.login'
 
     # --- Register Blueprints ---
-    from .routes import auth, main, resources
+    from .routes import auth, main, resources, ipfs
     app.register_blueprint(auth.auth_bp)
     app.register_blueprint(main.main_bp)
     app.register_blueprint(resources.resources_bp)
+    app.register_blueprint(ipfs.ipfs_bp)
 
     # --- Socket.IO Handlers ---
     rooms = {} 
@@ -0,0 +1,162 @@
+# display_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from .search_cache import catalogue_version
+
+# Columns needed to render a resource in a result list (never the embedding).
+DISPLAY_FIELDS = ('id', 'titulo', 'descripcion', 'categoria', 'enlace', 'cid', 'filename')
+
+# Display fields of the resources whose IDs fill `{placeholders}`.
+FETCH_SQL = f"SELECT {', '.join(DISPLAY_FIELDS)} FROM recursos WHERE id IN ({{placeholders}})"
+# Oldest entry still in the change log, and the entries after a given one.
+FIRST_CHANGE_SQL = "SELECT MIN(seq) FROM recursos_cambios"
+CHANGES_SQL = "SELECT seq, recurso_id FROM recursos_cambios WHERE seq > ? ORDER BY seq"
+
+
+class DisplayCache:
+    """
+    In-memory LRU cache of the fields shown for each resource in search
+    results, so a ranking from the vector index can be rendered without
+    reading `recursos` again.
+
+    Entries are compact tuples and the description is cut to
+    `description_chars`. Every write to the display columns of `recursos`,
+    from any process, is recorded in `recursos_cambios` by triggers; at most
+    every `sync_interval` seconds the cache reads the new log entries and
+    re-reads only the cached resources that changed. Resources missing from
+    the cache are read from SQLite on demand (read-through).
+    """
+    def __init__(self, max_entries=100000, description_chars=300, sync_interval=1.0, log_retention=10000):
+        self.max_entries = max_entries
+        self.description_chars = description_chars
+        self.sync_interval = sync_interval
+        self.log_retention = log_retention
+        self._entries = OrderedDict()
+        self._last_seq = None
+        self._synced_at = float('-inf')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Reads the cache limits from the application configuration."""
+        self.max_entries = app.config['DISPLAY_CACHE_MAX_ENTRIES']
+        self.description_chars = app.config['DISPLAY_CACHE_DESCRIPTION_CHARS']
+        self.sync_interval = app.config['DISPLAY_CACHE_SYNC_INTERVAL']
+        self.clear()
+
+    def clear(self):
+        """Removes all entries; the change log is read from its end on next use."""
+        with self._lock:
+            self._entries.clear()
+            self._last_seq = None
+            self._synced_at = float('-inf')
+
+    def _entry(self, row) -> tuple:
+        descripcion = row[2]
+        if descripcion and len(descripcion) > self.description_chars:
+            descripcion = descripcion[:self.description_chars].rstrip() + '…'
+        return (row[0], row[1], descripcion, row[3], row[4], row[5], row[6])
+
+    def _fetch(self, conn, resource_ids) -> dict:
+        placeholders = ', '.join('?' for _ in resource_ids)
+        rows = conn.execute(FETCH_SQL.format(placeholders=placeholders), list(resource_ids)).fetchall()
+        return {row[0]: self._entry(row) for row in rows}
+
+    def _store(self, entries: dict):
+        for resource_id, entry in entries.items():
+            self._entries[resource_id] = entry
+            self._entries.move_to_end(resource_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def sync(self, conn, force: bool = False):
+        """
+        Applies the writes recorded since the last sync: changed resources
+        that are cached are re-read, deleted ones are dropped. If the log was
+        pruned past the last entry seen, the whole cache is cleared.
+        """
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            last_seq = self._last_seq
+        if last_seq is None:
+            # First use: nothing is cached yet, so start from the end of the log.
+            last_seq = catalogue_version(conn)
+            with self._lock:
+                self._last_seq, self._synced_at = last_seq, now
+            return
+
+        first = conn.execute(FIRST_CHANGE_SQL).fetchone()[0]
+        changes = conn.execute(CHANGES_SQL, (last_seq,)).fetchall()
+        with self._lock:
+            cached = {r[1] for r in changes if r[1] in self._entries}
+        fresh = self._fetch(conn, cached) if cached else {}
+
+        with self._lock:
+            if first is not None and first > last_seq + 1:
+                self._entries.clear()
+            else:
+                for resource_id in cached:
+                    self._entries.pop(resource_id, None)
+                self._store(fresh)
+            if changes:
+                self._last_seq = changes[-1][0]
+            self._synced_at = now
+
+        if changes and changes[-1][0] - (first or 0) > 2 * self.log_retention:
+            # Keep the log short; a process that falls further behind starts over.
+            conn.execute("DELETE FROM recursos_cambios WHERE seq <= ?", (changes[-1][0] - self.log_retention,))
+            conn.commit()
+
+    def get_many(self, resource_ids: list, connect) -> dict:
+        """
+        Returns the display fields of the given resources as {id: dict}.
+        Resources that no longer exist are left out.
+
+        Args:
+            resource_ids (list): Resource IDs (ints).
+            connect: A function returning an SQLite connection, called only
+                when the cache has to sync or read misses.
+        """
+        conn = None
+        try:
+            if time.monotonic() - self._synced_at >= self.sync_interval:
+                conn = connect()
+                self.sync(conn)
+
+            found = {}
+            with self._lock:
+                for resource_id in resource_ids:
+                    entry = self._entries.get(resource_id)
+                    if entry is not None:
+                        self._entries.move_to_end(resource_id)
+                        found[resource_id] = entry
+                self.hits += len(found)
+                self.misses += len(resource_ids) - len(found)
+
+            missing = [i for i in resource_ids if i not in found]
+            if missing:
+                conn = conn or connect()
+                seen_seq = self._last_seq
+                fetched = self._fetch(conn, missing)
+                with self._lock:
+                    # A sync in between may have skipped these rows because
+                    # they were not cached yet, so only keep them if none ran.
+                    if self.max_entries > 0 and self._last_seq == seen_seq:
+                        self._store(fetched)
+                found.update(fetched)
+        finally:
+            if conn is not None:
+                conn.close()
+        return {resource_id: dict(zip(DISPLAY_FIELDS, entry)) for resource_id, entry in found.items()}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Global instance, bound to the app in the factory like the other extensions.
+display_cache = DisplayCache()
@@ -0,0 +1,232 @@
+# documents.py
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from pypdf import PdfReader
+
+from .nlp_utils import tokenizar, generar_embeddings_ventanas, embedding_to_blob
+from .vector_db import add_chunk_embeddings
+from .search_cache import record_changes
+
+# Extensions whose content is read as plain text.
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.tex', '.html', '.htm', '.json', '.xml', '.py', '.java', '.c', '.cpp', '.js'}
+
+def iter_text_blocks(stream, filename: str, block_chars: int = 64 * 1024):
+    """
+    Extracts the text of an uploaded document as a sequence of blocks, so that
+    the whole document never has to be decoded into memory at once.
+    Plain text files are read `block_chars` characters at a time and split at
+    the last whitespace (so words are not cut in half); PDFs are read page by
+    page. Unsupported formats produce no blocks.
+
+    Args:
+        stream: A seekable binary file object positioned at the start.
+        filename (str): The original file name, used to detect the format.
+        block_chars (int): Approximate size of each text block.
+
+    Yields:
+        str: Consecutive blocks of text.
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+
+    if ext == '.pdf':
+        reader = PdfReader(stream)
+        for page in reader.pages:
+            texto = page.extract_text() or ''
+            if texto.strip():
+                yield texto
+        return
+
+    if ext not in TEXT_EXTENSIONS:
+        return
+
+    wrapper = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+    try:
+        resto = ''
+        while True:
+            bloque = wrapper.read(block_chars)
+            if not bloque:
+                break
+            bloque = resto + bloque
+            corte = max(bloque.rfind(' '), bloque.rfind('\n'))
+            if corte <= 0:
+                resto = ''
+            else:
+                bloque, resto = bloque[:corte], bloque[corte:]
+            yield bloque
+        if resto.strip():
+            yield resto
+    finally:
+        # Detach so that closing the wrapper does not close the upload stream.
+        wrapper.detach()
+
+def iter_token_windows(blocks, tokenize, window: int = 256, overlap: int = 64):
+    """
+    Splits a stream of text blocks into overlapping windows of tokens.
+    Only the tokens that have not been emitted yet are kept in memory.
+
+    Args:
+        blocks: An iterable of text blocks.
+        tokenize: A function mapping a text to a list of tokens.
+        window (int): Number of tokens per window.
+        overlap (int): Number of tokens shared by consecutive windows.
+
+    Yields:
+        list: Consecutive windows of tokens.
+    """
+    if not 0 <= overlap < window:
+        raise ValueError("overlap debe ser menor que window.")
+
+    step = window - overlap
+    buffer = []
+    emitted = False
+    for bloque in blocks:
+        buffer.extend(tokenize(bloque))
+        while len(buffer) >= window:
+            yield buffer[:window]
+            emitted = True
+            buffer = buffer[step:]
+    # The tail is only worth a window if it has tokens not covered yet.
+    if buffer and (not emitted or len(buffer) > overlap):
+        yield buffer
+
+def index_document(conn, resource_id: int, stream, filename: str, config) -> int:
+    """
+    Extracts, chunks and embeds an uploaded document, storing the chunk
+    vectors in SQLite (`recursos_chunks`) and in the chunk collection of the
+    vector database. Work is done in batches of `CHUNK_BATCH_SIZE` windows and
+    stops after `CHUNK_MAX_PER_DOCUMENT` chunks, so memory use is bounded
+    regardless of the file size. Each batch is embedded outside any
+    transaction and then committed on its own, so the database write lock is
+    never held while the model runs.
+
+    Args:
+        conn: An open SQLite connection with no transaction in progress.
+        resource_id (int): The resource the document belongs to.
+        stream: A seekable binary file object with the document.
+        filename (str): The original file name.
+        config: The application configuration.
+
+    Returns:
+        int: The number of chunks indexed.
+    """
+    max_chunks = config['CHUNK_MAX_PER_DOCUMENT']
+    batch_size = config['CHUNK_BATCH_SIZE']
+    blocks = iter_text_blocks(stream, filename, config['CHUNK_TEXT_BLOCK_CHARS'])
+    windows = iter_token_windows(blocks, tokenizar, config['CHUNK_WINDOW_TOKENS'], config['CHUNK_OVERLAP_TOKENS'])
+
+    count = 0
+    batch = []
+    for ventana in windows:
+        batch.append(ventana)
+        if len(batch) == batch_size or count + len(batch) == max_chunks:
+            count += _store_chunk_batch(conn, resource_id, count, batch)
+            batch = []
+        if count >= max_chunks:
+            break
+    if batch:
+        count += _store_chunk_batch(conn, resource_id, count, batch)
+    return count
+
+def _store_chunk_batch(conn, resource_id: int, first_index: int, batch: list) -> int:
+    """
+    Embeds one batch of windows and writes the vectors to both stores.
+    The SQLite rows are committed before the vector index is written, so the
+    reconciler never finds index vectors without their rows (and backfills
+    the vectors if the process dies in between).
+    """
+    embeddings = generar_embeddings_ventanas(batch)
+    conn.executemany(
+        "INSERT OR REPLACE INTO recursos_chunks (recurso_id, chunk_index, embedding) VALUES (?, ?, ?)",
+        [(resource_id, first_index + i, embedding_to_blob(e)) for i, e in enumerate(embeddings)]
+    )
+    conn.commit()
+    add_chunk_embeddings(resource_id, first_index, embeddings)
+    return len(batch)
+
+
+class DocumentIndexer:
+    """
+    Indexes the content of uploaded documents on a small background thread
+    pool, so an upload returns as soon as the resource is saved instead of
+    waiting for every chunk to be embedded.
+
+    The upload is copied to a temporary file, since the request stream is
+    gone once the response is sent. When a document is indexed its resource
+    is written to `recursos_cambios`, so search results cached before the
+    chunks existed are invalidated. Chunks are committed batch by batch; if
+    a job dies halfway, reconcile_chroma.py adds the vectors of the chunks
+    it had committed to the index.
+    """
+    def __init__(self, workers=1):
+        self.workers = workers
+        self._config = {}
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Reads the pool size, database and chunk sizes from the application configuration."""
+        with self._lock:
+            self.workers = app.config['CHUNK_INDEX_WORKERS']
+            self._config = {key: value for key, value in app.config.items()
+                            if key.startswith('CHUNK_') or key == 'DATABASE_URL'}
+            self._executor = None
+
+    def submit(self, resource_id: int, stream, filename: str):
+        """
+        Copies an uploaded document to a temporary file and queues it for
+        indexing. Returns the Future of the job.
+        """
+        suffix = os.path.splitext(filename or '')[1]
+        fd, path = tempfile.mkstemp(prefix='rea-upload-', suffix=suffix)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(stream, f)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="document-index")
+            future = self._executor.submit(self._index_file, resource_id, path, filename, self._config)
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def wait(self, timeout=None):
+        """Blocks until the queued documents are indexed (used by tests and on shutdown)."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    @staticmethod
+    def _index_file(resource_id: int, path: str, filename: str, config: dict) -> int:
+        conn = sqlite3.connect(config['DATABASE_URL'])
+        try:
+            if conn.execute("SELECT 1 FROM recursos WHERE id = ?", (resource_id,)).fetchone() is None:
+                return 0
+            with open(path, 'rb') as stream:
+                count = index_document(conn, resource_id, stream, filename, config)
+            record_changes(conn, [resource_id])
+            return count
+        except Exception as e:
+            conn.rollback()
+            print(f"Error al indexar el contenido del documento {filename}: {e}")
+            return 0
+        finally:
+            conn.close()
+            os.remove(path)
+
+
+# Global instance, bound to the app in the factory like the other extensions.
+document_indexer = DocumentIndexer()
@@ -0,0 +1,126 @@
+# duplicates.py
+import numpy as np
+from .nlp_utils import get_storage_dtype
+from .vector_db import query_nearest, get_embeddings
+from .neighbors import load_embedding_matrix
+
+# Similarity margin below the threshold within which pairs found on compact
+# (lossy) embeddings are rechecked with full precision. The int8 rounding
+# error of a cosine between 768-d unit vectors stays well under it.
+RESCORE_MARGIN = 0.02
+
+def find_near_duplicate(embedding: np.ndarray, threshold: float):
+    """
+    Looks up the closest indexed resource (top-1 query) and reports it when
+    its cosine similarity reaches `threshold`.
+
+    Returns:
+        tuple: (resource_id, similarity) of the near-duplicate, or (None, similarity).
+    """
+    resource_id, similarity = query_nearest(embedding)
+    if resource_id is not None and similarity >= threshold:
+        return resource_id, similarity
+    return None, similarity
+
+def iter_duplicate_pairs(matrix: np.ndarray, threshold: float, block_size: int = 1024):
+    """
+    Finds every pair of rows whose cosine similarity reaches `threshold`.
+    Only the upper triangle is computed, one (block_size x block_size) tile
+    at a time, so memory stays O(block_size^2) no matter the corpus size.
+    Rows are expected to be L2-normalized.
+
+    Yields:
+        tuple: (i, j, similarity) with i < j (row indices into `matrix`).
+    """
+    n = matrix.shape[0]
+    for start in range(0, n, block_size):
+        rows = matrix[start:start + block_size]
+        for col_start in range(start, n, block_size):
+            sims = rows @ matrix[col_start:col_start + block_size].T
+            if col_start == start:
+                # Ignore the diagonal and the mirrored lower triangle.
+                sims[np.tril_indices(sims.shape[0], m=sims.shape[1])] = -np.inf
+            for r, c in zip(*np.nonzero(sims >= threshold)):
+                yield start + int(r), col_start + int(c), float(sims[r, c])
+
+def group_duplicates(n: int, pairs) -> list:
+    """
+    Groups rows connected by duplicate pairs (union-find), so that chains of
+    near-duplicates end up in the same group.
+
+    Returns:
+        list: Lists of row indices, one per group with at least two members.
+    """
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+def link_duplicate(conn, resource_id: int, duplicado_de: int, similitud: float):
+    """Marks a resource as a near-duplicate of another one. The caller commits."""
+    conn.execute(
+        "INSERT OR REPLACE INTO recursos_duplicados (recurso_id, duplicado_de, similitud) VALUES (?, ?, ?)",
+        (resource_id, duplicado_de, similitud)
+    )
+
+def rescore_pairs(ids: np.ndarray, pairs, threshold: float):
+    """
+    Rechecks candidate pairs with the full-precision vectors of the vector
+    index, keeping those that still reach `threshold`. Pairs whose vectors
+    are not indexed are judged on their approximate similarity.
+
+    Returns:
+        list: The (i, j, similarity) pairs that pass.
+    """
+    pairs = list(pairs)
+    full = get_embeddings([int(ids[r]) for r in {r for i, j, _ in pairs for r in (i, j)}])
+    result = []
+    for i, j, similarity in pairs:
+        a, b = full.get(int(ids[i])), full.get(int(ids[j]))
+        if a is not None and b is not None:
+            similarity = float(a @ b)
+        if similarity >= threshold:
+            result.append((i, j, similarity))
+    return result
+
+def find_duplicate_groups(conn, threshold: float, block_size: int = 1024) -> list:
+    """
+    Clusters the existing corpus into groups of near-duplicates and links every
+    member of a group to its oldest resource (the lowest ID).
+    With compact (lossy) stored embeddings, pairs slightly below the threshold
+    are shortlisted too and every pair is confirmed with full precision.
+
+    Returns:
+        list: The groups found, as lists of resource IDs (oldest first).
+    """
+    ids, matrix = load_embedding_matrix(conn)
+    if get_storage_dtype() != 'float32':
+        pairs = rescore_pairs(ids, iter_duplicate_pairs(matrix, threshold - RESCORE_MARGIN, block_size), threshold)
+    else:
+        pairs = list(iter_duplicate_pairs(matrix, threshold, block_size))
+    groups = group_duplicates(len(ids), pairs)
+    similarities = {(i, j): s for i, j, s in pairs}
+
+    result = []
+    for members in groups:
+        canonical = members[0]
+        conn.execute("DELETE FROM recursos_duplicados WHERE recurso_id = ?", (int(ids[canonical]),))
+        for member in members[1:]:
+            similitud = similarities.get((canonical, member), float(matrix[member] @ matrix[canonical]))
+            link_duplicate(conn, int(ids[member]), int(ids[canonical]), similitud)
+        conn.commit()
+        result.append([int(ids[m]) for m in members])
+    return result
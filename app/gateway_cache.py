@@ -0,0 +1,189 @@
+# gateway_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class GatewayCache:
+    """
+    Size-bounded on-disk LRU cache of files fetched from the IPFS gateway.
+
+    Files are stored under a name derived from their CID and file name. Since
+    a CID always refers to the same content, an entry never needs to be
+    invalidated: it only leaves the cache when it is evicted to stay under
+    `max_bytes`. The recency of an entry is kept in the file's mtime, so the
+    LRU order survives restarts and is shared by every worker process using
+    the same directory. The directory is measured again before evicting, so
+    the limit holds for all the workers together, not for each one.
+    """
+    def __init__(self, directory='ipfs_cache', max_bytes=1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+
+    def init_app(self, app):
+        """Reads the cache location and size limit from the application configuration."""
+        self.configure(app.config['IPFS_CACHE_DIR'], app.config['IPFS_CACHE_MAX_BYTES'])
+
+    def configure(self, directory, max_bytes):
+        """Points the cache at a directory. The index is built on first use."""
+        with self._lock:
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self._entries = OrderedDict()
+            self._size = 0
+            self._loaded = False
+
+    def _load(self):
+        """
+        Indexes the files on disk, least recently used first, including the
+        ones written or evicted by other processes since the last scan.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._entries = OrderedDict()
+        self._size = 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+        self._loaded = True
+
+    @staticmethod
+    def key(cid: str, filename: str) -> str:
+        return hashlib.sha256(f"{cid}/{filename}".encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_or_fetch(self, cid: str, filename: str, fetch) -> str:
+        """
+        Returns the path of the cached file, downloading it on a miss.
+        Concurrent misses for the same file only download it once.
+        The file may still be evicted (by this or another process) before the
+        caller opens it, so callers must handle FileNotFoundError.
+
+        Args:
+            cid (str): The CID of the content.
+            filename (str): The file name within the CID.
+            fetch: A function that writes the content into a binary file object.
+
+        Returns:
+            str: The path of the file on disk.
+        """
+        key = self.key(cid, filename)
+        path = self.path(key)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        if self._touch(key, path):
+            return path
+
+        # Misses share a per-key lock, counted so the last one removes it.
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            fetch_lock[1] += 1
+        try:
+            with fetch_lock[0]:
+                if self._touch(key, path):
+                    return path
+                self._fetch(key, path, fetch)
+        finally:
+            with self._lock:
+                fetch_lock[1] -= 1
+                if fetch_lock[1] == 0:
+                    self._fetch_locks.pop(key, None)
+        return path
+
+    def _fetch(self, key: str, path: str, fetch):
+        """Downloads one file into the cache and evicts to stay under the limit."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fetch(f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            # Index the directory again, now with this file, before the fetch
+            # lock is released, so files cached by other workers count
+            # towards the limit too.
+            with self._lock:
+                self.misses += 1
+                self.bytes_fetched += size
+                self._load()
+                self._evict(keep=key)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _touch(self, key: str, path: str) -> bool:
+        """
+        Records a hit if the file is on disk. Another process may have evicted
+        it, or cached it without this process knowing.
+        """
+        with self._lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self._size -= self._entries.pop(key, 0)
+                return False
+            if key not in self._entries:
+                self._entries[key] = os.path.getsize(path)
+                self._size += self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += self._entries[key]
+            return True
+
+    def _evict(self, keep: str):
+        """Removes least recently used files until the cache fits in `max_bytes`."""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._size -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Returns the hit rate and the traffic saved since the process started."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes_fetched': self.bytes_fetched,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Global instance, bound to the app in the factory like the other extensions.
+gateway_cache = GatewayCache()
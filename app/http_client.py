@@ -0,0 +1,214 @@
+# http_client.py
+import asyncio
+import threading
+import time
+import httpx
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a request is refused because the remote service is failing."""
+
+
+class CircuitBreaker:
+    """
+    Per-service circuit breaker.
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests fail fast for `reset_timeout` seconds. Then a single trial
+    request is let through: if it succeeds the circuit closes again,
+    otherwise it stays open for another `reset_timeout`.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Returns True if a request may be sent now."""
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial_in_progress:
+            self._trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def record(self, succeeded: bool):
+        """Records the outcome of a request that `allow` let through."""
+        if succeeded:
+            self.record_success()
+        else:
+            self.record_failure()
+
+
+class AsyncHttpClient:
+    """
+    Shared asynchronous HTTP client for all outbound traffic.
+    It keeps a pool of connections (httpx), caps the number of concurrent
+    requests per service and opens a circuit breaker for a service that keeps
+    failing. An instance must only be used from one event loop.
+
+    Requests are grouped by `key`, which defaults to the URL's host. Pass an
+    explicit key when one service is reached through many hosts (e.g. the
+    IPFS gateway, which uses one subdomain per CID).
+    """
+    def __init__(self, max_connections=20, per_host_limit=4, timeout=30.0,
+                 failure_threshold=5, reset_timeout=30.0, transport=None):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.transport = transport
+        self._client = None
+        self._semaphores = {}
+        self._breakers = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=self.timeout,
+                transport=self.transport,
+            )
+        return self._client
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        """Returns the circuit breaker of a service."""
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[key]
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.per_host_limit)
+        return self._semaphores[key]
+
+    async def request(self, method: str, url: str, key: str = None, **kwargs) -> httpx.Response:
+        """
+        Sends a request through the connection pool.
+        Responses below 500 (including 4xx) count as successes of the
+        service; 5xx responses, connection errors, timeouts and any other
+        exception count as failures. The outcome is always recorded, so a
+        half-open circuit never waits forever for its trial request.
+
+        Raises:
+            CircuitOpenError: If the circuit of the service is open.
+            httpx.TransportError: If the request could not be completed.
+        """
+        key = key or httpx.URL(url).host
+        breaker = self.breaker(key)
+        if not breaker.allow():
+            raise CircuitOpenError(f"El servicio {key} no está disponible temporalmente.")
+
+        succeeded = False
+        try:
+            async with self._semaphore(key):
+                response = await self._get_client().request(method, url, **kwargs)
+            succeeded = response.status_code < 500
+        finally:
+            breaker.record(succeeded)
+        return response
+
+    async def download(self, url: str, fileobj, key: str = None, chunk_size: int = 64 * 1024) -> int:
+        """
+        Streams the body of a GET response into a binary file object without
+        holding it in memory.
+
+        The outcome is recorded like in `request`: a 4xx is a success of
+        the service, while a 5xx or any exception (including errors writing
+        the file) is a failure.
+
+        Returns:
+            int: The number of bytes written.
+
+        Raises:
+            httpx.HTTPStatusError: If the response status is not successful.
+        """
+        key = key or httpx.URL(url).host
+        breaker = self.breaker(key)
+        if not breaker.allow():
+            raise CircuitOpenError(f"El servicio {key} no está disponible temporalmente.")
+
+        written = 0
+        succeeded = False
+        try:
+            async with self._semaphore(key):
+                async with self._get_client().stream('GET', url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        fileobj.write(chunk)
+                        written += len(chunk)
+            succeeded = True
+        except httpx.HTTPStatusError as e:
+            # The service answered; a 4xx is the caller's problem.
+            succeeded = e.response.status_code < 500
+            raise
+        finally:
+            breaker.record(succeeded)
+        return written
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SyncHttpClient:
+    """
+    Blocking facade over `AsyncHttpClient` for Flask views and scripts.
+    The async client runs on a private event loop in a daemon thread, so
+    every caller shares the same connection pool, concurrency caps and
+    circuit breakers.
+    """
+    def __init__(self, async_client: AsyncHttpClient = None):
+        self.async_client = async_client or AsyncHttpClient()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, transport=None):
+        """Configures the client from the application configuration."""
+        self.async_client = AsyncHttpClient(
+            max_connections=app.config['HTTP_MAX_CONNECTIONS'],
+            per_host_limit=app.config['HTTP_PER_HOST_LIMIT'],
+            timeout=app.config['HTTP_TIMEOUT'],
+            failure_threshold=app.config['HTTP_CIRCUIT_FAILURES'],
+            reset_timeout=app.config['HTTP_CIRCUIT_RESET'],
+            transport=transport,
+        )
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True).start()
+            return self._loop
+
+    def run(self, coro):
+        """Runs a coroutine on the client's event loop and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    def request(self, method: str, url: str, key: str = None, **kwargs) -> httpx.Response:
+        return self.run(self.async_client.request(method, url, key=key, **kwargs))
+
+    def download(self, url: str, fileobj, key: str = None) -> int:
+        return self.run(self.async_client.download(url, fileobj, key=key))
+
+
+# Global instance, bound to the app in the factory like the other extensions.
+http_client = SyncHttpClient()
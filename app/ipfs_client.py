@@ -1,13 +1,26 @@
-import requests
 from flask import current_app
 
-def upload_to_ipfs(file_bytes, filename):
+from .http_client import http_client
+
+# Key under which the pinning service and the gateway share concurrency caps
+# and circuit breakers (the gateway uses a different subdomain per CID).
+UPLOAD_SERVICE = "ipfs-upload"
+GATEWAY_SERVICE = "ipfs-gateway"
+
+def gateway_url(cid, filename):
+    """Builds the public gateway URL of a file from the configured template."""
+    return current_app.config['IPFS_GATEWAY_URL'].format(cid=cid, filename=filename)
+
+def upload_to_ipfs(file, filename):
     """
     Uploads a file to IPFS using the Web3.Storage API.
-    It retrieves the API token from the current Flask app configuration.
+    It retrieves the API token and the endpoints from the current Flask app configuration.
+    The request goes through the shared HTTP client, so it is pooled, capped
+    and refused quickly while the pinning service is failing.
 
     Args:
-        file_bytes (bytes): The file content in bytes.
+        file (bytes or file-like): The file content, or a binary file object
+            that is streamed instead of being read into memory.
         filename (str): The name of the file.
 
     Returns:
@@ -20,17 +33,18 @@ def upload_to_ipfs(file_bytes, filename):
         # Raise an error if the token is not configured in the app.
         raise RuntimeError("WEB3_STORAGE_TOKEN is not set in the application configuration.")
         
-    url = "https://api.web3.storage/upload"
+    url = current_app.config['IPFS_UPLOAD_URL']
     headers = {"Authorization": f"Bearer {token}"}
-    files = {"file": (filename, file_bytes)}
+    files = {"file": (filename, file)}
     
     # Send the POST request to upload the file.
-    r = requests.post(url, headers=headers, files=files, timeout=120)
+    r = http_client.request("POST", url, key=UPLOAD_SERVICE, headers=headers, files=files,
+                            timeout=current_app.config['IPFS_UPLOAD_TIMEOUT'])
     r.raise_for_status()
     
     # Get the CID and gateway URL from the response.
     data = r.json()
     cid = data.get("cid")
-    gateway_url = f"https://{cid}.ipfs.w3s.link/{filename}" if cid else None
+    url = gateway_url(cid, filename) if cid else None
     
-    return cid, gateway_url
\ No newline at end of file
+    return cid, url
@@ -0,0 +1,121 @@
+# migrations.py
+import sqlite3
+
+# Ordered list of schema migrations as (version, description, statements).
+# The version applied to a database is stored in `PRAGMA user_version`, so
+# each migration runs exactly once. Never edit a released migration: append
+# a new one instead.
+MIGRATIONS = [
+    (1, "Esquema base", [
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'user'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recursos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        titulo TEXT NOT NULL,
+        descripcion TEXT,
+        categoria TEXT,
+        enlace TEXT,
+        cid TEXT,
+        filename TEXT,
+        embedding BLOB,
+        user_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES usuarios (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recursos_similares (
+        recurso_id INTEGER NOT NULL,
+        similar_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (recurso_id, similar_id),
+        FOREIGN KEY (recurso_id) REFERENCES recursos (id),
+        FOREIGN KEY (similar_id) REFERENCES recursos (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recursos_chunks (
+        recurso_id INTEGER NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        embedding BLOB NOT NULL,
+        PRIMARY KEY (recurso_id, chunk_index),
+        FOREIGN KEY (recurso_id) REFERENCES recursos (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recursos_duplicados (
+        recurso_id INTEGER PRIMARY KEY,
+        duplicado_de INTEGER NOT NULL,
+        similitud REAL NOT NULL,
+        FOREIGN KEY (recurso_id) REFERENCES recursos (id),
+        FOREIGN KEY (duplicado_de) REFERENCES recursos (id)
+        )
+        """,
+    ]),
+    (2, "Índice de CIDs para el proxy de IPFS y la importación del catálogo", [
+        "CREATE INDEX IF NOT EXISTS idx_recursos_cid ON recursos (cid, filename)",
+    ]),
+    (3, "Registro de cambios de recursos para el caché de visualización", [
+        """
+        CREATE TABLE IF NOT EXISTS recursos_cambios (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        recurso_id INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS recursos_cambios_insert AFTER INSERT ON recursos
+        BEGIN INSERT INTO recursos_cambios (recurso_id) VALUES (NEW.id); END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS recursos_cambios_update
+        AFTER UPDATE OF titulo, descripcion, categoria, enlace, cid, filename ON recursos
+        BEGIN INSERT INTO recursos_cambios (recurso_id) VALUES (NEW.id); END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS recursos_cambios_delete AFTER DELETE ON recursos
+        BEGIN INSERT INTO recursos_cambios (recurso_id) VALUES (OLD.id); END
+        """,
+    ]),
+    (4, "Marca de categoría asignada manualmente", [
+        "ALTER TABLE recursos ADD COLUMN categoria_manual INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+def get_version(conn) -> int:
+    """Returns the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn) -> int:
+    """
+    Applies the pending migrations in order, each one in its own transaction
+    together with the bump of `PRAGMA user_version`, so a failed migration
+    leaves the database at the previous version.
+    Databases created before the migrations existed (version 0) are
+    upgraded in place, since the base schema uses IF NOT EXISTS.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    version = get_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Migración {number} aplicada: {description}")
+        version = number
+    return version
@@ -0,0 +1,197 @@
+# neighbors.py
+import numpy as np
+from config import Config
+from .nlp_utils import blob_to_embedding, get_storage_dtype
+from .vector_db import query_similar, cosine_to_score, get_embeddings
+
+# Number of related resources kept for each resource.
+DEFAULT_TOP_K = 5
+
+# Keyset page of stored embeddings, in ID order.
+EMBEDDINGS_PAGE_SQL = "SELECT id, embedding FROM recursos WHERE embedding IS NOT NULL AND id > ? ORDER BY id LIMIT ?"
+# Precomputed related resources of one resource, best first.
+NEIGHBORS_SQL = "SELECT similar_id, score FROM recursos_similares WHERE recurso_id = ? ORDER BY score DESC"
+
+def load_embedding_matrix(conn, batch_size: int = 1000) -> (np.ndarray, np.ndarray):
+    """
+    Loads every stored embedding into a single float32 matrix.
+    Rows are read in batches (keyset pagination on the ID) so that only one
+    batch of BLOBs is held by the cursor at a time.
+
+    Returns:
+        tuple: An array with the resource IDs and the (n, dim) embedding matrix.
+    """
+    total = conn.execute("SELECT COUNT(*) FROM recursos WHERE embedding IS NOT NULL").fetchone()[0]
+    ids = np.empty(total, dtype=np.int64)
+    matrix = None
+    n = 0
+    last_id = 0
+    while n < total:
+        rows = conn.execute(EMBEDDINGS_PAGE_SQL, (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            vector = blob_to_embedding(row[1])
+            if matrix is None:
+                matrix = np.empty((total, vector.shape[0]), dtype=np.float32)
+            if vector.shape[0] != matrix.shape[1]:
+                print(f"Embedding con dimensión inesperada para el recurso {row[0]}, se omite.")
+                continue
+            ids[n] = row[0]
+            matrix[n] = vector
+            n += 1
+        last_id = rows[-1][0]
+
+    if matrix is None:
+        return ids[:0], np.empty((0, 0), dtype=np.float32)
+    return ids[:n], matrix[:n]
+
+def top_k_blocked(matrix: np.ndarray, k: int = DEFAULT_TOP_K, block_size: int = 1024):
+    """
+    Computes the all-pairs top-k cosine neighbors of the rows of `matrix`.
+    The similarity matrix is never materialized: it is computed in
+    (block_size x block_size) tiles and a running top-k is merged per tile,
+    so peak memory is O(block_size^2) on top of the input matrix.
+    Rows are expected to be L2-normalized.
+
+    Yields:
+        tuple: (start, indices, similarities) for each block of rows, where
+        `indices` and `similarities` have shape (rows_in_block, k') with
+        k' = min(k, n - 1), sorted by decreasing similarity.
+    """
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return
+
+    for start in range(0, n, block_size):
+        rows = matrix[start:start + block_size]
+        b = rows.shape[0]
+        best_sim = np.full((b, k), -np.inf, dtype=np.float32)
+        best_idx = np.full((b, k), -1, dtype=np.int64)
+
+        for col_start in range(0, n, block_size):
+            cols = matrix[col_start:col_start + block_size]
+            sims = rows @ cols.T
+            # A resource is never its own neighbor.
+            if col_start < start + b and start < col_start + cols.shape[0]:
+                r = np.arange(b)
+                c = r + start - col_start
+                valid = (c >= 0) & (c < cols.shape[0])
+                sims[r[valid], c[valid]] = -np.inf
+
+            col_idx = np.broadcast_to(np.arange(col_start, col_start + cols.shape[0]), sims.shape)
+            cand_sim = np.concatenate([best_sim, sims], axis=1)
+            cand_idx = np.concatenate([best_idx, col_idx], axis=1)
+            part = np.argpartition(-cand_sim, k - 1, axis=1)[:, :k]
+            best_sim = np.take_along_axis(cand_sim, part, axis=1)
+            best_idx = np.take_along_axis(cand_idx, part, axis=1)
+
+        order = np.argsort(-best_sim, axis=1)
+        yield start, np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(best_sim, order, axis=1)
+
+def rescore_shortlist(ids: np.ndarray, start: int, idx: np.ndarray, sims: np.ndarray, k: int):
+    """
+    Re-ranks a block of shortlisted neighbors (as yielded by `top_k_blocked`
+    on compact, lossy embeddings) with the full-precision vectors of the
+    vector index, keeping the best `k`. Pairs whose vectors are not indexed
+    keep their approximate similarity.
+
+    Returns:
+        tuple: (indices, similarities) with shape (rows_in_block, min(k, shortlist)).
+    """
+    valid = idx >= 0
+    rows = ids[start:start + idx.shape[0]]
+    full = get_embeddings([int(i) for i in set(rows.tolist()) | set(ids[idx[valid]].tolist())])
+
+    sims = sims.copy()
+    for r, resource_id in enumerate(rows):
+        query = full.get(int(resource_id))
+        if query is None:
+            continue
+        for c in np.nonzero(valid[r])[0]:
+            candidate = full.get(int(ids[idx[r, c]]))
+            if candidate is not None:
+                sims[r, c] = query @ candidate
+
+    k = min(k, idx.shape[1])
+    order = np.argsort(-sims, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+def store_neighbors(conn, neighbors_by_resource: dict):
+    """
+    Replaces the stored neighbor lists of the given resources.
+
+    Args:
+        conn: An open SQLite connection. The caller commits.
+        neighbors_by_resource (dict): Maps a resource ID to a list of
+            (similar_id, score) tuples.
+    """
+    conn.executemany("DELETE FROM recursos_similares WHERE recurso_id = ?",
+                     [(rid,) for rid in neighbors_by_resource])
+    conn.executemany(
+        "INSERT INTO recursos_similares (recurso_id, similar_id, score) VALUES (?, ?, ?)",
+        [(rid, sid, score) for rid, lst in neighbors_by_resource.items() for sid, score in lst]
+    )
+
+def get_neighbors(conn, resource_id: int) -> list:
+    """Returns the stored (similar_id, score) list of a resource, best first."""
+    rows = conn.execute(NEIGHBORS_SQL, (resource_id,)).fetchall()
+    return [(r[0], r[1]) for r in rows]
+
+def query_neighbors(resource_id: int, embedding: np.ndarray, k: int = DEFAULT_TOP_K) -> list:
+    """
+    Queries the vector index with a stored embedding (no model inference)
+    and returns the (similar_id, score) list of the resource, excluding itself.
+    """
+    ids, scores = query_similar(embedding, k + 1)
+    return [(int(i), s) for i, s in zip(ids, scores) if int(i) != resource_id][:k]
+
+def update_neighbors_for(conn, resource_id: int, embedding: np.ndarray, k: int = DEFAULT_TOP_K) -> list:
+    """
+    Incrementally refreshes the neighbor lists after a resource is indexed.
+    The new resource gets its own list, and it is inserted into the lists of
+    its neighbors when it beats their current worst entry (similarity is
+    symmetric, so only these lists can change).
+    """
+    neighbors = query_neighbors(resource_id, embedding, k)
+    store_neighbors(conn, {resource_id: neighbors})
+
+    for similar_id, score in neighbors:
+        current = get_neighbors(conn, similar_id)
+        if len(current) >= k and score <= current[-1][1]:
+            continue
+        current = [(sid, s) for sid, s in current if sid != resource_id]
+        current.append((resource_id, score))
+        current.sort(key=lambda pair: pair[1], reverse=True)
+        store_neighbors(conn, {similar_id: current[:k]})
+    return neighbors
+
+def precompute_all(conn, k: int = DEFAULT_TOP_K, block_size: int = 1024, oversample: int = None) -> int:
+    """
+    Recomputes the neighbor lists of every resource with an embedding using
+    blocked matrix multiplications, committing once per block of rows.
+    When the embeddings are stored in a compact format, `k * oversample`
+    candidates are shortlisted and rescored with full precision
+    (`oversample` defaults to RESCORE_OVERSAMPLE in that case, 1 otherwise).
+
+    Returns:
+        int: The number of resources whose list was written.
+    """
+    if oversample is None:
+        oversample = Config.RESCORE_OVERSAMPLE if get_storage_dtype() != 'float32' else 1
+    ids, matrix = load_embedding_matrix(conn)
+    written = 0
+    for start, idx, sims in top_k_blocked(matrix, k * oversample, block_size):
+        if oversample > 1:
+            idx, sims = rescore_shortlist(ids, start, idx, sims, k)
+        batch = {}
+        for row in range(idx.shape[0]):
+            batch[int(ids[start + row])] = [
+                (int(ids[j]), cosine_to_score(float(s)))
+                for j, s in zip(idx[row], sims[row]) if j >= 0 and np.isfinite(s)
+            ]
+        store_neighbors(conn, batch)
+        conn.commit()
+        written += len(batch)
+    return written
@@ -1,33 +1,23 @@
 # nlp_utils.py
 
+import hashlib
+import re
+import struct
+import threading
 import numpy as np
-import torch
-from transformers import pipeline, AutoTokenizer, AutoModel
 import logging
 
+from config import Config
+
 # Configure logging to suppress transformers warnings
 logging.basicConfig(level=logging.ERROR)
 
-# --- Constants and Model Loading (once) ---
+# --- Constants ---
 MODEL_NAME = "dccuchile/bert-base-spanish-wwm-uncased"
 CLASSIFIER_MODEL = "facebook/bart-large-mnli" # A good model for zero-shot
 
-# Load models once for efficiency
-try:
-    print("Cargando modelos de NLP... (puede tardar un momento la primera vez)")
-    # Model for embeddings
-    tokenizer_emb = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model_emb = AutoModel.from_pretrained(MODEL_NAME)
-    
-    # Pipeline for zero-shot classification
-    # We use a different and more suitable model for this task
-    classifier = pipeline("zero-shot-classification", model=CLASSIFIER_MODEL)
-    print("Modelos cargados correctamente.")
-
-except Exception as e:
-    print(f"Error crítico al cargar modelos de NLP: {e}")
-    # If the models do not load, the functions will fail. We could exit or handle it.
-    tokenizer_emb, model_emb, classifier = None, None, None
+# Size of the vectors produced by the embedding model.
+EMBEDDING_DIM = 768
 
 # Predefined categories for classification
 CATEGORIAS_POSIBLES = [
@@ -35,35 +25,277 @@ CATEGORIAS_POSIBLES = [
     "biología", "historia", "literatura", "arte", "música", "idiomas"
 ]
 
+# Category assigned when the automatic classification fails
+SIN_CLASIFICAR = "Sin clasificar"
+
+
+# --- Backends ---
+class TransformersBackend:
+    """
+    BERT embeddings and zero-shot BART classification.
+    The models are loaded on first use (once per process), so importing the
+    app does not pay for them.
+    """
+    model_version = MODEL_NAME
+
+    def __init__(self):
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.tokenizer_emb = self.model_emb = self.classifier = None
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                import torch
+                from transformers import pipeline, AutoTokenizer, AutoModel
+                self.torch = torch
+                print("Cargando modelos de NLP... (puede tardar un momento la primera vez)")
+                # Model for embeddings
+                self.tokenizer_emb = AutoTokenizer.from_pretrained(MODEL_NAME)
+                self.model_emb = AutoModel.from_pretrained(MODEL_NAME)
+
+                # Pipeline for zero-shot classification
+                # We use a different and more suitable model for this task
+                self.classifier = pipeline("zero-shot-classification", model=CLASSIFIER_MODEL)
+                print("Modelos cargados correctamente.")
+            except Exception as e:
+                print(f"Error crítico al cargar modelos de NLP: {e}")
+                # If the models do not load, the functions will fail.
+                self.tokenizer_emb, self.model_emb, self.classifier = None, None, None
+            self._loaded = True
+
+    def _require_embedder(self):
+        self._load()
+        if not self.tokenizer_emb or not self.model_emb:
+            raise RuntimeError("El modelo de embeddings no está cargado.")
+
+    def embed(self, texto: str) -> np.ndarray:
+        self._require_embedder()
+        inputs = self.tokenizer_emb(texto, return_tensors="pt", truncation=True, max_length=512, padding=True)
+        with self.torch.no_grad():
+            outputs = self.model_emb(**inputs)
+        # We use the embedding of the [CLS] token (first position)
+        embedding = outputs.last_hidden_state[0, 0, :].cpu().numpy()
+        # Normalize the vector (improves cosine similarity)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm != 0 else embedding
+
+    def tokenize(self, texto: str) -> list:
+        self._load()
+        if not self.tokenizer_emb:
+            raise RuntimeError("El modelo de embeddings no está cargado.")
+        return self.tokenizer_emb(texto, add_special_tokens=False)['input_ids']
+
+    def embed_windows(self, ventanas: list) -> np.ndarray:
+        self._require_embedder()
+        input_ids = [self.tokenizer_emb.build_inputs_with_special_tokens(v) for v in ventanas]
+        inputs = self.tokenizer_emb.pad({'input_ids': input_ids}, return_tensors="pt")
+        with self.torch.no_grad():
+            outputs = self.model_emb(**inputs)
+        # [CLS] token of every window, normalized like `embed`
+        embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy().astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+    def classify(self, textos: list, batch_size: int = 8) -> list:
+        self._load()
+        if not self.classifier:
+            raise RuntimeError("El pipeline de clasificación no está cargado.")
+        # The pipeline handles everything
+        resultados = self.classifier(textos, candidate_labels=CATEGORIAS_POSIBLES, batch_size=batch_size)
+        if isinstance(resultados, dict):
+            resultados = [resultados]
+        # The category with the highest score of every text
+        return [r['labels'][0] for r in resultados]
+
+
+class StubBackend:
+    """
+    Deterministic, model-free backend for tests and local development.
+    Embeddings are normalized feature-hashed bags of words, so texts sharing
+    words are close to each other, and a text always gets the same vector.
+    Classification picks the category whose name is closest to the text.
+    """
+    TOKEN_RE = re.compile(r"\w+")
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.model_version = f"stub-hash-{dim}"
+        self._categorias = None
+
+    def _hash_vector(self, words) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in words:
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % self.dim] += 1.0 if (value >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Empty text: a fixed unit vector, like the model gives a fixed [CLS].
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+    def embed(self, texto: str) -> np.ndarray:
+        return self._hash_vector(self.tokenize(texto))
+
+    def tokenize(self, texto: str) -> list:
+        return self.TOKEN_RE.findall(texto.lower())
+
+    def embed_windows(self, ventanas: list) -> np.ndarray:
+        if not ventanas:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._hash_vector(v) for v in ventanas])
+
+    def classify(self, textos: list, batch_size: int = 8) -> list:
+        if self._categorias is None:
+            self._categorias = np.stack([self.embed(c) for c in CATEGORIAS_POSIBLES])
+        if not textos:
+            return []
+        scores = np.stack([self.embed(t) for t in textos]) @ self._categorias.T
+        return [CATEGORIAS_POSIBLES[i] for i in scores.argmax(axis=1)]
+
+
+# Available backends, selected with the NLP_BACKEND setting.
+BACKENDS = {
+    'transformers': TransformersBackend,
+    'stub': StubBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def configure(name: str):
+    """Selects the NLP backend by name. Models are not loaded until they are used."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de NLP desconocido: {name}")
+    with _backend_lock:
+        if not isinstance(_backend, BACKENDS[name]):
+            _backend = BACKENDS[name]()
+
+def init_app(app):
+    """Selects the NLP backend and the embedding storage format from the application configuration."""
+    configure(app.config['NLP_BACKEND'])
+    configure_storage(app.config['EMBEDDING_STORAGE_DTYPE'])
+
+def get_backend():
+    """Returns the active backend (the configured default outside the app, e.g. in scripts)."""
+    if _backend is None:
+        configure(Config.NLP_BACKEND)
+    return _backend
+
+
 def generar_embedding(texto: str) -> np.ndarray:
-    """Generates an embedding for a text using the BERT model."""
-    if not tokenizer_emb or not model_emb:
-        raise RuntimeError("El modelo de embeddings no está cargado.")
-        
-    inputs = tokenizer_emb(texto, return_tensors="pt", truncation=True, max_length=512, padding=True)
-    with torch.no_grad():
-        outputs = model_emb(**inputs)
-    # We use the embedding of the [CLS] token (first position)
-    embedding = outputs.last_hidden_state[0, 0, :].cpu().numpy()
-    # Normalize the vector (improves cosine similarity)
-    norm = np.linalg.norm(embedding)
-    return embedding / norm if norm != 0 else embedding
+    """Generates a normalized embedding for a text."""
+    return get_backend().embed(texto)
+
+def tokenizar(texto: str) -> list:
+    """Converts a text into tokens of the embedding model, without special tokens."""
+    return get_backend().tokenize(texto)
+
+def generar_embeddings_ventanas(ventanas: list) -> np.ndarray:
+    """
+    Generates normalized embeddings for a batch of token windows in a single
+    forward pass. Each window is a list of tokens (as returned by
+    `tokenizar`) no longer than the model's maximum length minus the
+    special tokens.
+
+    Returns:
+        np.ndarray: A (len(ventanas), dim) float32 matrix.
+    """
+    return get_backend().embed_windows(ventanas)
 
 def clasificar_texto(texto: str) -> str:
-    """Classifies a text into one of the predefined categories using zero-shot."""
-    if not classifier:
-        raise RuntimeError("El pipeline de clasificación no está cargado.")
+    """Classifies a text into one of the predefined categories."""
+    return get_backend().classify([texto])[0]
+
+def clasificar_lote(textos: list, batch_size: int = 8) -> list:
+    """
+    Classifies a list of texts, letting the backend batch the forward passes.
+    Returns one category per text, in the same order.
+    """
+    if not textos:
+        return []
+    return get_backend().classify(textos, batch_size=batch_size)
+
+# --- Serialization Functions ---
+# Embedding BLOBs start with a header: the magic bytes, the storage dtype,
+# and the model that produced the vector. The magic is a float32 NaN, which
+# a normalized vector can never contain, so BLOBs written before the header
+# existed (raw float32) are still recognized.
+BLOB_MAGIC = b'\x00\x00\xc0\x7f'
+EMBEDDING_DTYPES = {'float32': 0, 'float16': 1, 'int8': 2}
+_DTYPE_NAMES = {code: name for name, code in EMBEDDING_DTYPES.items()}
+
+_storage_dtype = None
+
+def configure_storage(dtype: str):
+    """Selects the format new embedding BLOBs are written in."""
+    global _storage_dtype
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Formato de embedding desconocido: {dtype}")
+    _storage_dtype = dtype
+
+def get_storage_dtype() -> str:
+    return _storage_dtype or Config.EMBEDDING_STORAGE_DTYPE
+
+def embedding_to_blob(embedding: np.ndarray, dtype: str = None, model_version: str = None) -> bytes:
+    """
+    Converts a numpy vector to bytes to save it in the DB.
+    float16 halves the size; int8 stores one byte per dimension plus a
+    per-vector float32 scale (max |x| / 127), a quarter of the float32 size.
+
+    Args:
+        embedding (np.ndarray): The vector.
+        dtype (str): 'float32', 'float16' or 'int8'. Defaults to EMBEDDING_STORAGE_DTYPE.
+        model_version (str): Model that produced the vector. Defaults to the active backend's.
+    """
+    dtype = dtype or get_storage_dtype()
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Formato de embedding desconocido: {dtype}")
+    tag = (model_version or get_backend().model_version).encode('utf-8')
+    header = BLOB_MAGIC + struct.pack('<BB', EMBEDDING_DTYPES[dtype], len(tag)) + tag
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    if dtype == 'float32':
+        return header + vector.astype('<f4').tobytes()
+    if dtype == 'float16':
+        return header + vector.astype('<f2').tobytes()
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    scale = peak / 127 if peak > 0 else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return header + struct.pack('<f', scale) + quantized.tobytes()
+
+def parse_embedding_blob(blob: bytes) -> (np.ndarray, str, str):
+    """
+    Decodes an embedding BLOB of any format.
 
-    # The pipeline handles everything
-    resultado = classifier(texto, candidate_labels=CATEGORIAS_POSIBLES)
-    # Returns the category with the highest score
-    return resultado['labels'][0]
+    Returns:
+        tuple: The float32 vector, the storage dtype and the model version
+        (None for BLOBs written before they were tagged).
+    """
+    if blob[:4] != BLOB_MAGIC:
+        return np.frombuffer(blob, dtype=np.float32), 'float32', None
+    code, tag_len = struct.unpack_from('<BB', blob, 4)
+    dtype = _DTYPE_NAMES.get(code)
+    if dtype is None:
+        raise ValueError(f"Formato de embedding desconocido: {code}")
+    offset = 6 + tag_len
+    model_version = blob[6:offset].decode('utf-8')
 
-# --- Serialization Functions (unchanged) ---
-def embedding_to_blob(embedding: np.ndarray) -> bytes:
-    """Converts a numpy vector to bytes to save it in the DB."""
-    return embedding.tobytes()
+    if dtype == 'float32':
+        vector = np.frombuffer(blob, dtype='<f4', offset=offset).astype(np.float32)
+    elif dtype == 'float16':
+        vector = np.frombuffer(blob, dtype='<f2', offset=offset).astype(np.float32)
+    else:
+        scale, = struct.unpack_from('<f', blob, offset)
+        vector = np.frombuffer(blob, dtype=np.int8, offset=offset + 4).astype(np.float32) * np.float32(scale)
+    return vector, dtype, model_version
 
 def blob_to_embedding(blob: bytes) -> np.ndarray:
-    """Converts bytes from the DB back to a numpy vector."""
-    return np.frombuffer(blob, dtype=np.float32)
+    """Converts bytes from the DB back to a float32 numpy vector, whatever their storage format."""
+    return parse_embedding_blob(blob)[0]
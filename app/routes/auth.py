@@ -1,11 +1,11 @@
 import sqlite3
 import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required
 import passwordmeter
 
 from app.models import User
+from app.security import password_hasher, login_limiter, HasherBusyError
 
 # The database connection function will be in the main __init__.py, but routes need access to it.
 # We will import it from the app package.
@@ -14,6 +14,9 @@ from app import get_conn
 # Create a Blueprint for authentication routes
 auth_bp = Blueprint('auth', __name__, template_folder='../templates')
 
+# Account lookup on every login attempt (email is UNIQUE, so it is indexed).
+LOGIN_USER_SQL = "SELECT id, email, password_hash, role FROM usuarios WHERE email = ?"
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     """
@@ -24,6 +27,10 @@ def register():
         email = request.form['email']
         password = request.form['password']
 
+        if not login_limiter.allow(request.remote_addr):
+            flash('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 'error')
+            return render_template('register.html'), 429
+
         # Validate that the email is from the institutional domain
         if not email.endswith('@alumno.buap.mx'):
             flash('Solo se permiten registros con el correo institucional "@alumno.buap.mx".', 'error')
@@ -35,20 +42,23 @@ def register():
             flash('La contraseña es muy débil. Por favor, elige una más segura.', 'error')
             return redirect(url_for('auth.register'))
         
+        # Hash the password (on the bounded hashing pool)
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusyError:
+            flash('El servidor está ocupado. Por favor, inténtalo de nuevo en unos segundos.', 'error')
+            return render_template('register.html'), 503
+
+        # Save the new user; the UNIQUE constraint on the email tells us if it already exists
         conn = get_conn()
-        # Check if the user already exists
-        user_exists = conn.execute("SELECT id FROM usuarios WHERE email = ?", (email,)).fetchone()
-        if user_exists:
+        try:
+            conn.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)", (email, hashed_password))
+            conn.commit()
+        except sqlite3.IntegrityError:
             flash('Ese correo electrónico ya está registrado.', 'error')
-            conn.close()
             return redirect(url_for('auth.register'))
-        
-        # Hash the password and save the new user to the database
-        hashed_password = generate_password_hash(password)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)", (email, hashed_password))
-        conn.commit()
-        conn.close()
+        finally:
+            conn.close()
         flash('¡Registro exitoso! Por favor, inicia sesión con tu correo.', 'success')
         return redirect(url_for('auth.login'))
     
@@ -64,12 +74,36 @@ def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+
+        if not login_limiter.allow(request.remote_addr, email):
+            flash('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 'error')
+            return render_template('login.html'), 429
+
         conn = get_conn()
-        user_data = conn.execute("SELECT id, email, password_hash, role FROM usuarios WHERE email = ?", (email,)).fetchone()
+        user_data = conn.execute(LOGIN_USER_SQL, (email,)).fetchone()
         conn.close()
         
         # Check if the user exists and the password is correct
-        if user_data and check_password_hash(user_data['password_hash'], password):
+        try:
+            valid = bool(user_data) and password_hasher.verify(user_data['password_hash'], password)
+        except HasherBusyError:
+            flash('El servidor está ocupado. Por favor, inténtalo de nuevo en unos segundos.', 'error')
+            return render_template('login.html'), 503
+
+        # Upgrade hashes made with an older method or cost transparently.
+        # This is best-effort: if the pool is busy, the next login retries it.
+        if valid:
+            try:
+                if password_hasher.needs_rehash(user_data['password_hash']):
+                    new_hash = password_hasher.hash(password)
+                    conn = get_conn()
+                    conn.execute("UPDATE usuarios SET password_hash = ? WHERE id = ?", (new_hash, user_data['id']))
+                    conn.commit()
+                    conn.close()
+            except HasherBusyError:
+                print(f"Rehash del usuario {user_data['id']} omitido: el pool de contraseñas está ocupado.")
+
+        if valid:
             user = User(id=user_data['id'], email=user_data['email'], role=user_data['role'])
             login_user(user)
             session.permanent = True
@@ -0,0 +1,72 @@
+import re
+import httpx
+from flask import Blueprint, abort, send_file, jsonify
+from flask_login import current_user, login_required
+
+from app import get_conn
+from app.gateway_cache import gateway_cache
+from app.http_client import http_client, CircuitOpenError
+from app.ipfs_client import gateway_url, GATEWAY_SERVICE
+
+# Create a Blueprint for the local IPFS gateway proxy
+ipfs_bp = Blueprint('ipfs', __name__)
+
+# CIDs are base32/base58 strings, so anything else is rejected early.
+CID_PATTERN = re.compile(r'^[A-Za-z0-9]+$')
+
+# Content behind a CID never changes, so browsers may keep it for a year.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Whether a CID and file name belong to a known resource.
+KNOWN_FILE_SQL = "SELECT 1 FROM recursos WHERE cid = ? AND filename = ? LIMIT 1"
+
+@ipfs_bp.route('/ipfs/<cid>/<filename>')
+@login_required
+def descargar(cid, filename):
+    """
+    Route to download a resource file through the local read-through cache.
+    Only files of known resources are served. The file is fetched from the
+    public gateway on the first request and served from disk afterwards,
+    with support for conditional and Range requests.
+    """
+    if not CID_PATTERN.match(cid):
+        abort(404)
+
+    conn = get_conn()
+    known = conn.execute(KNOWN_FILE_SQL, (cid, filename)).fetchone()
+    conn.close()
+    if not known:
+        abort(404)
+
+    url = gateway_url(cid, filename)
+    # The cached file can be evicted between the lookup and opening it; in
+    # that case it is fetched again once, and after that we give up.
+    for attempt in range(2):
+        try:
+            path = gateway_cache.get_or_fetch(cid, filename, lambda f: http_client.download(url, f, key=GATEWAY_SERVICE))
+        except CircuitOpenError:
+            abort(503)
+        except httpx.HTTPStatusError as e:
+            abort(404 if e.response.status_code == 404 else 502)
+        except httpx.HTTPError:
+            abort(502)
+
+        try:
+            # send_file handles Range/If-None-Match and lets the server use sendfile.
+            response = send_file(path, download_name=filename, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+        except FileNotFoundError:
+            continue
+        response.cache_control.immutable = True
+        return response
+    abort(503)
+
+@ipfs_bp.route('/ipfs/stats')
+@login_required
+def estadisticas():
+    """
+    Route with the hit rate and the bytes saved by the gateway cache.
+    Only available to administrators.
+    """
+    if current_user.role != 'admin':
+        abort(403)
+    return jsonify(gateway_cache.stats())
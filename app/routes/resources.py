@@ -1,15 +1,36 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import hashlib
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, make_response, abort
 from flask_login import current_user, login_required
 
 from app import get_conn
 from app.ipfs_client import upload_to_ipfs
-from app.nlp_utils import generar_embedding, clasificar_texto, embedding_to_blob
+from app.nlp_utils import generar_embedding, clasificar_texto, embedding_to_blob, blob_to_embedding, SIN_CLASIFICAR
 from app.vector_db import add_embedding as add_embedding_to_chroma
-from app.vector_db import query_similar
+from app.vector_db import query_similar, query_similar_chunks, merge_rankings, get_embeddings
+from app.search_cache import search_cache, catalogue_version, record_changes
+from app.display_cache import display_cache
+from app.neighbors import get_neighbors, query_neighbors, store_neighbors, update_neighbors_for
+from app.documents import document_indexer
+from app.duplicates import find_near_duplicate, link_duplicate
 
 # Create a Blueprint for resource-related routes
 resources_bp = Blueprint('resources', __name__, template_folder='../templates')
 
+# The whole catalogue, newest first, with the group each near-duplicate belongs to.
+LIST_RESOURCES_SQL = """
+    SELECT r.*, d.duplicado_de FROM recursos r
+    LEFT JOIN recursos_duplicados d ON d.recurso_id = r.id
+    ORDER BY r.id DESC
+"""
+# The resource a new upload duplicates, and the head of its group if it has one.
+DUPLICATE_ORIGINAL_SQL = """
+    SELECT r.id, r.titulo, d.duplicado_de FROM recursos r
+    LEFT JOIN recursos_duplicados d ON d.recurso_id = r.id
+    WHERE r.id = ?
+"""
+RESOURCE_SQL = "SELECT * FROM recursos WHERE id = ?"
+
 @resources_bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
 def nuevo():
@@ -31,12 +52,11 @@ def nuevo():
         filename = None
         file = request.files.get('archivo')
         
-        # If a file is uploaded, upload it to IPFS
+        # If a file is uploaded, upload it to IPFS (streamed from the upload)
         if file and file.filename:
-            content = file.read()
             filename = file.filename
             try:
-                cid, gateway_url = upload_to_ipfs(content, filename)
+                cid, gateway_url = upload_to_ipfs(file.stream, filename)
             except Exception as e:
                 flash(f"Error subiendo a IPFS: {e}", "error")
                 return redirect(request.url)
@@ -53,25 +73,57 @@ def nuevo():
         except Exception as e:
             # Handle NLP errors
             print(f"ERROR en NLP: {e}")
-            categoria_detectada = categoria_manual or "Sin clasificar"
+            categoria_detectada = categoria_manual or SIN_CLASIFICAR
             emb_blob = None
             flash_message = "Recurso guardado, pero ocurrió un error al clasificarlo automáticamente."
             flash_category = "warning"
 
+        # Check whether the same material is already indexed (top-1 query)
+        duplicado_de, similitud = None, 0.0
+        if emb_vec is not None:
+            duplicado_de, similitud = find_near_duplicate(emb_vec, current_app.config['DUPLICATE_SIMILARITY_THRESHOLD'])
+
         # Save the resource to the database
         conn = get_conn()
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO recursos (titulo, descripcion, categoria, enlace, cid, filename, embedding, user_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (titulo, descripcion, categoria_detectada, gateway_url, cid, filename, emb_blob, current_user.id))
+            INSERT INTO recursos (titulo, descripcion, categoria, categoria_manual, enlace, cid, filename, embedding, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (titulo, descripcion, categoria_detectada, int(categoria_manual is not None), gateway_url, cid, filename,
+              emb_blob, current_user.id))
         conn.commit()
 
+        # Link near-duplicates to the original resource (the head of its group)
+        if duplicado_de is not None:
+            original = conn.execute(DUPLICATE_ORIGINAL_SQL, (int(duplicado_de),)).fetchone()
+            if original:
+                original_id = original['duplicado_de'] or original['id']
+                link_duplicate(conn, cursor.lastrowid, original_id, similitud)
+                conn.commit()
+                flash_message += f". Parece un duplicado de «{original['titulo']}»."
+                flash_category = "warning"
+
         # If an embedding was generated, add it to the vector database
         if emb_vec is not None:
             resource_id = cursor.lastrowid
             metadata = {"titulo": titulo, "categoria": categoria_detectada}
             add_embedding_to_chroma(resource_id, emb_vec, metadata)
+            # Searches run before the vector existed must not stay cached.
+            record_changes(conn, [resource_id])
+            try:
+                update_neighbors_for(conn, resource_id, emb_vec, current_app.config['NEIGHBORS_TOP_K'])
+                conn.commit()
+            except Exception as e:
+                print(f"Error al actualizar los recursos similares de {resource_id}: {e}")
+
+            # Index the content of the uploaded document in overlapping chunks
+            # in the background, so the upload does not wait for it.
+            if filename:
+                try:
+                    file.stream.seek(0)
+                    document_indexer.submit(resource_id, file.stream, filename)
+                except Exception as e:
+                    print(f"Error al encolar el documento {filename} para indexarlo: {e}")
 
         conn.close()
         flash(flash_message, flash_category)
@@ -87,47 +139,127 @@ def recursos():
     Route to display all educational resources.
     """
     conn = get_conn()
-    recursos_data = conn.execute("SELECT * FROM recursos ORDER BY id DESC").fetchall()
+    recursos_data = conn.execute(LIST_RESOURCES_SQL).fetchall()
     conn.close()
     return render_template("recursos.html", recursos=recursos_data)
 
+@resources_bp.route('/recursos/<int:recurso_id>/similares')
+@login_required
+def similares(recurso_id):
+    """
+    Route to display the resources related to a given one.
+    Uses the precomputed neighbor list; if there is none yet, the vector index
+    is queried with the resource's embedding (no model inference), taken at
+    full precision from the index when it is there, and the result is saved
+    for the next visit.
+    """
+    conn = get_conn()
+    recurso = conn.execute(RESOURCE_SQL, (recurso_id,)).fetchone()
+    if recurso is None:
+        conn.close()
+        abort(404)
+
+    vecinos = get_neighbors(conn, recurso_id)
+    if not vecinos and recurso['embedding'] is not None:
+        embedding = get_embeddings([recurso_id]).get(recurso_id)
+        if embedding is None:
+            embedding = blob_to_embedding(recurso['embedding'])
+        vecinos = query_neighbors(recurso_id, embedding, current_app.config['NEIGHBORS_TOP_K'])
+        if vecinos:
+            store_neighbors(conn, {recurso_id: vecinos})
+            conn.commit()
+
+    conn.close()
+
+    relacionados = []
+    if vecinos:
+        recursos_dict = display_cache.get_many([sid for sid, _ in vecinos], get_conn)
+        for similar_id, score in vecinos:
+            relacionado = recursos_dict.get(similar_id)
+            if relacionado:
+                relacionado['score'] = score
+                relacionados.append(relacionado)
+    return render_template("similares.html", recurso=recurso, relacionados=relacionados)
+
+def _buscar_ids(q, top_k, version):
+    """
+    Returns the ranked resource IDs and scores for a query, using the search
+    cache to skip the embedding and the vector query for repeated searches.
+    """
+    key = search_cache.make_key(q, top_k)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    q_emb = generar_embedding(q)
+    # A resource matches either by its title/description or by any chunk of its document.
+    ids, scores = merge_rankings([query_similar(q_emb, top_k), query_similar_chunks(q_emb, top_k)], top_k)
+    search_cache.set(key, ids, scores, version)
+    return ids, scores
+
+def _search_etag(q, top_k, version):
+    """Builds an ETag that changes whenever the ranking could change (any write to the catalogue)."""
+    key = search_cache.make_key(q, top_k)
+    raw = f"{version}|{current_user.id}|{key!r}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
 @resources_bp.route('/buscar_semantico', methods=['GET', 'POST'])
 @login_required
 def buscar_semantico():
     """
     Route for semantic search.
-    Handles both displaying the search form (GET) and processing the search query (POST).
+    A GET without a query displays the search form. A GET with `q` (and
+    optionally `k`) runs the search and can be cached by the browser; POST is
+    kept for compatibility with older forms.
     """
-    if request.method == 'POST':
-        q = request.form.get('q', '').strip()
-        top_k = int(request.form.get('k', 5))
-        if not q:
-            flash("Por favor, introduce una consulta para buscar.", "error")
-            return render_template('buscar_semantico.html')
+    params = request.form if request.method == 'POST' else request.args
+    if request.method == 'GET' and 'q' not in params:
+        # Display the semantic search form
+        return render_template('buscar_semantico.html')
 
-        # Generate embedding for the query and search for similar resources
-        q_emb = generar_embedding(q)
-        ids, scores = query_similar(q_emb, top_k)
+    q = params.get('q', '').strip()
+    top_k = params.get('k', 5, type=int)
+    top_k = max(1, min(top_k, current_app.config['SEARCH_MAX_K']))
+    if not q:
+        flash("Por favor, introduce una consulta para buscar.", "error")
+        return render_template('buscar_semantico.html')
 
-        if not ids:
-            return render_template("resultados_busqueda.html", resultados=[], query=q)
+    # The catalogue version is read from the database on every search, so
+    # both the ETag and the cached rankings follow writes from any process.
+    conn = get_conn()
+    version = catalogue_version(conn)
+    conn.close()
+    search_cache.sync_generation(version)
 
-        # Get the full resource data from the database
-        conn = get_conn()
-        placeholders = ', '.join('?' for _ in ids)
-        query_sql = f"SELECT * FROM recursos WHERE id IN ({placeholders})"
-        recursos_dict = {str(r['id']): dict(r) for r in conn.execute(query_sql, [int(i) for i in ids]).fetchall()}
-        conn.close()
+    etag = None
+    if request.method == 'GET':
+        etag = _search_etag(q, top_k, version)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+    # Get the ranked IDs (from the cache when possible)
+    ids, scores = _buscar_ids(q, top_k, version)
 
-        # Sort the results by similarity score
-        results_sorted = []
-        for i, resource_id_str in enumerate(ids):
-            recurso = recursos_dict.get(resource_id_str)
+    results_sorted = []
+    if ids:
+        # Display fields come from the in-memory cache (SQLite is only read
+        # for misses), already in ranking order.
+        recursos_dict = display_cache.get_many([int(i) for i in ids], get_conn)
+        for resource_id_str, score in zip(ids, scores):
+            recurso = recursos_dict.get(int(resource_id_str))
             if recurso:
-                recurso['score'] = scores[i]
+                recurso['score'] = score
                 results_sorted.append(recurso)
-        
-        return render_template("resultados_busqueda.html", resultados=results_sorted, query=q)
 
-    # Display the semantic search form
-    return render_template('buscar_semantico.html')
+    response = make_response(render_template("resultados_busqueda.html", resultados=results_sorted, query=q))
+    if etag:
+        # Results depend on the user session, so only the browser may keep
+        # them, and it must revalidate every time: the ETag changes with the
+        # catalogue, so an unchanged search costs a 304 and a changed one is
+        # never served stale.
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
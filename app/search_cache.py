@@ -0,0 +1,113 @@
+# search_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+# Last entry of the change log; MAX on the INTEGER PRIMARY KEY is a single seek.
+CATALOGUE_VERSION_SQL = "SELECT COALESCE(MAX(seq), 0) FROM recursos_cambios"
+RECORD_CHANGE_SQL = "INSERT INTO recursos_cambios (recurso_id) VALUES (?)"
+
+def normalizar_consulta(q: str) -> str:
+    """Normalizes a query so that trivially different spellings share a cache entry."""
+    return " ".join(q.lower().split())
+
+
+def catalogue_version(conn) -> int:
+    """
+    Returns a number that grows with every write that can change a search
+    result, from any process: the last entry of the `recursos_cambios` log
+    (filled by triggers on `recursos` and by the indexing jobs).
+    """
+    return conn.execute(CATALOGUE_VERSION_SQL).fetchone()[0]
+
+
+def record_changes(conn, resource_ids):
+    """
+    Writes the given resources to the change log and commits, bumping the
+    catalogue version. Call it after writing to the vector index: the
+    triggers log the SQLite write before the vectors exist, so a ranking
+    computed in between would otherwise be cached as current.
+    """
+    conn.executemany(RECORD_CHANGE_SQL, [(int(i),) for i in resource_ids])
+    conn.commit()
+
+
+class SearchCache:
+    """
+    In-memory LRU cache for semantic search results.
+
+    Entries hold the ranked resource IDs and their scores for a given
+    (query, k, filters) key. They expire after a TTL and are invalidated as a
+    whole whenever the generation changes. The generation follows
+    `catalogue_version`, so writes made by scripts or by other workers
+    invalidate the cache too, not only the ones made by this process.
+    """
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Reads the cache limits from the application configuration."""
+        self.max_entries = app.config.get('SEARCH_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('SEARCH_CACHE_TTL', self.ttl)
+        self.clear()
+
+    @staticmethod
+    def make_key(q: str, top_k: int, filters: dict = None) -> tuple:
+        """Builds the cache key for a query, its result size and any filters."""
+        return (normalizar_consulta(q), int(top_k), tuple(sorted((filters or {}).items())))
+
+    def get(self, key):
+        """
+        Returns the cached (ids, scores) for a key, or None on a miss.
+        Expired entries and entries from an older generation are dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generation, stored_at, value = entry
+            if generation != self.generation or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, ids, scores, generation):
+        """
+        Stores a ranking computed at catalogue version `generation` (read
+        before computing it), evicting the least recently used entries if
+        needed. A ranking from an older version than the current one is
+        dropped, since the catalogue changed while it was computed.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic(), (list(ids), list(scores)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def sync_generation(self, generation: int):
+        """Adopts the current catalogue version, dropping every ranking if it changed."""
+        with self._lock:
+            if generation != self.generation:
+                self.generation = generation
+                self._entries.clear()
+
+    def clear(self):
+        """Removes all entries without changing the generation."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Global instance, bound to the app in the factory like the other extensions.
+search_cache = SearchCache()
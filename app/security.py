@@ -0,0 +1,147 @@
+# security.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusyError(RuntimeError):
+    """Raised when too many password hashes are already waiting to run."""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a small, bounded thread pool.
+    Hashing is CPU-bound and deliberately slow, so capping how many hashes run
+    at once keeps a burst of logins from starving every other route. Requests
+    that would queue beyond `workers * queue_factor` are refused instead of
+    piling up.
+    """
+    def __init__(self, method='scrypt', workers=2, queue_factor=4, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.queue_factor = queue_factor
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Reads the hash method and pool size from the application configuration."""
+        with self._lock:
+            self.method = app.config['PASSWORD_HASH_METHOD']
+            self.workers = app.config['PASSWORD_HASH_WORKERS']
+            self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+            self._executor = None
+            self._slots = None
+            self._prefix = None
+
+    def _submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+                self._slots = threading.BoundedSemaphore(self.workers * self.queue_factor)
+            executor, slots = self._executor, self._slots
+
+        if not slots.acquire(timeout=self.timeout):
+            raise HasherBusyError("Demasiadas operaciones de contraseña en curso.")
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Drop it if it has not started; a running hash finishes and frees its slot.
+            future.cancel()
+            raise HasherBusyError("La operación de contraseña tardó demasiado.")
+
+    def hash(self, password: str) -> str:
+        """Hashes a password with the configured method."""
+        return self._submit(generate_password_hash, password, method=self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Checks a password against a stored hash (of any supported method)."""
+        return self._submit(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """
+        Returns True if a stored hash was made with a different method or cost
+        than the configured one, so it should be replaced after a successful login.
+        """
+        if self._prefix is None:
+            # Werkzeug fills in default parameters (e.g. 'scrypt' becomes
+            # 'scrypt:32768:8:1'), so take the prefix from a real hash.
+            self._prefix = self.hash('').split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+
+class TokenBucket:
+    """Token bucket holding up to `capacity` tokens, refilled at `rate` tokens per second."""
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """
+    In-memory per-key rate limiter (one token bucket per key).
+    At most `max_keys` buckets are kept; the least recently used ones are
+    dropped, which only ever makes the limiter more lenient.
+    """
+    def __init__(self, attempts: int, per_seconds: float, max_keys: int = 10000):
+        self.attempts = attempts
+        self.per_seconds = per_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key) -> bool:
+        """Consumes one attempt for a key. Returns False if it is over the limit."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.attempts, self.attempts / self.per_seconds)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            return bucket.consume()
+
+
+class LoginRateLimiter:
+    """Limits authentication attempts per client IP and per email address."""
+    def __init__(self):
+        self.by_ip = RateLimiter(20, 60)
+        self.by_email = RateLimiter(5, 60)
+
+    def init_app(self, app):
+        """Reads the limits, as (attempts, seconds) pairs, from the application configuration."""
+        self.by_ip = RateLimiter(*app.config['LOGIN_RATE_LIMIT_PER_IP'])
+        self.by_email = RateLimiter(*app.config['LOGIN_RATE_LIMIT_PER_EMAIL'])
+
+    def allow(self, ip: str, email: str = None) -> bool:
+        """Consumes an attempt for the IP and, if given, for the email."""
+        allowed = self.by_ip.allow(ip)
+        if email:
+            allowed = self.by_email.allow(email.lower()) and allowed
+        return allowed
+
+
+# Global instances, bound to the app in the factory like the other extensions.
+password_hasher = PasswordHasher()
+login_limiter = LoginRateLimiter()
@@ -1,24 +1,185 @@
 # vector_db.py
-import chromadb
+import threading
 import numpy as np
+from config import Config
 from .nlp_utils import blob_to_embedding
 
-# --- CHROMA DB CLIENT ---
-# We use PersistentClient so that the database is saved to disk.
-# A folder named 'chroma_db' will be created in the root of your project.
-try:
-    client = chromadb.PersistentClient(path="chroma_db")
-except Exception as e:
-    print(f"Error al inicializar ChromaDB: {e}")
-    client = None
-
-# --- COLLECTION ---
-# A collection is like a "table" for your vectors.
-try:
-    collection = client.get_or_create_collection(name="recursos_educativos")
-except Exception as e:
-    print(f"Error al obtener o crear la colección en ChromaDB: {e}")
-    collection = None
+# Names of the collections: one vector per resource, and the chunk vectors
+# of uploaded documents (IDs are "<resource_id>:<chunk_index>" and the
+# metadata keeps the resource ID).
+COLLECTION_NAME = "recursos_educativos"
+CHUNK_COLLECTION_NAME = "recursos_chunks"
+
+
+class InMemoryCollection:
+    """
+    Process-local stand-in for the subset of the Chroma collection API used
+    by this module (add, upsert, update, get, query, delete, count).
+    Distances are squared L2, like Chroma's default space. Nothing is
+    persisted, which makes it suitable for tests and local development.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._vectors = {}
+        self._metadatas = {}
+        self._ids = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def add(self, ids, embeddings, metadatas=None):
+        with self._lock:
+            for i in ids:
+                if i in self._vectors:
+                    raise ValueError(f"ID duplicado en la colección {self.name}: {i}")
+        self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, metadatas=None):
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for i, embedding, metadata in zip(ids, embeddings, metadatas):
+                self._vectors[i] = np.asarray(embedding, dtype=np.float32)
+                self._metadatas[i] = metadata
+            self._matrix = None
+
+    def update(self, ids, metadatas):
+        with self._lock:
+            for i, metadata in zip(ids, metadatas):
+                if i in self._vectors:
+                    # Like ChromaDB, the given keys are merged into the existing metadata.
+                    self._metadatas[i] = {**(self._metadatas.get(i) or {}), **metadata}
+
+    def delete(self, ids):
+        with self._lock:
+            for i in ids:
+                self._vectors.pop(i, None)
+                self._metadatas.pop(i, None)
+            self._matrix = None
+
+    def count(self) -> int:
+        return len(self._vectors)
+
+    def get(self, ids=None, limit=None, offset=None, include=("metadatas",)):
+        with self._lock:
+            if ids is None:
+                selected = list(self._vectors)[offset or 0:]
+                if limit is not None:
+                    selected = selected[:limit]
+            else:
+                selected = [i for i in ids if i in self._vectors]
+            result = {'ids': selected}
+            if 'metadatas' in include:
+                result['metadatas'] = [self._metadatas[i] for i in selected]
+            if 'embeddings' in include:
+                result['embeddings'] = [self._vectors[i].tolist() for i in selected]
+            return result
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "distances")):
+        with self._lock:
+            if self._matrix is None:
+                self._ids = list(self._vectors)
+                self._matrix = (np.stack([self._vectors[i] for i in self._ids])
+                                if self._ids else np.zeros((0, 0), dtype=np.float32))
+            ids, matrix = self._ids, self._matrix
+            metadatas = dict(self._metadatas)
+
+        result = {'ids': [], 'distances': [], 'metadatas': []}
+        for embedding in query_embeddings:
+            if not ids:
+                hits, distances = [], []
+            else:
+                q = np.asarray(embedding, dtype=np.float32)
+                all_distances = ((matrix - q) ** 2).sum(axis=1)
+                k = min(n_results, len(ids))
+                top = np.argpartition(all_distances, k - 1)[:k]
+                top = top[np.argsort(all_distances[top], kind='stable')]
+                hits = [ids[j] for j in top]
+                distances = [float(all_distances[j]) for j in top]
+            result['ids'].append(hits)
+            result['distances'].append(distances)
+            result['metadatas'].append([metadatas[i] for i in hits])
+        if 'distances' not in include:
+            del result['distances']
+        if 'metadatas' not in include:
+            del result['metadatas']
+        return result
+
+
+def _open_chroma(path: str) -> dict:
+    """Opens the persistent Chroma client and both collections."""
+    try:
+        import chromadb
+        # PersistentClient saves the database to disk, in the folder given by CHROMA_PATH.
+        client = chromadb.PersistentClient(path=path)
+    except Exception as e:
+        print(f"Error al inicializar ChromaDB: {e}")
+        return {}
+
+    collections = {}
+    for name in (COLLECTION_NAME, CHUNK_COLLECTION_NAME):
+        # A collection is like a "table" for your vectors.
+        try:
+            collections[name] = client.get_or_create_collection(name=name)
+        except Exception as e:
+            print(f"Error al obtener o crear la colección {name} en ChromaDB: {e}")
+    return collections
+
+def _open_memory(path: str) -> dict:
+    return {name: InMemoryCollection(name) for name in (COLLECTION_NAME, CHUNK_COLLECTION_NAME)}
+
+# Available vector stores, selected with the VECTOR_BACKEND setting.
+BACKENDS = {
+    'chroma': _open_chroma,
+    'memory': _open_memory,
+}
+
+_settings = None
+_collections = None
+_collections_lock = threading.Lock()
+
+def configure(name: str, path: str = None):
+    """
+    Selects the vector store by name. The store is opened on first use;
+    selecting 'memory' again starts from an empty store.
+    """
+    global _settings, _collections
+    if name not in BACKENDS:
+        raise ValueError(f"Almacén vectorial desconocido: {name}")
+    with _collections_lock:
+        if (name, path) != _settings or name == 'memory':
+            _settings = (name, path)
+            _collections = None
+
+def init_app(app):
+    """Selects the vector store from the application configuration."""
+    configure(app.config['VECTOR_BACKEND'], app.config['CHROMA_PATH'])
+
+def get_collection(name: str = COLLECTION_NAME):
+    """
+    Returns a collection of the active store, or None if it is unavailable.
+    Outside the app (e.g. in scripts) the configured default is used.
+    """
+    global _collections
+    with _collections_lock:
+        if _collections is None:
+            backend, path = _settings or (Config.VECTOR_BACKEND, Config.CHROMA_PATH)
+            _collections = BACKENDS[backend](path)
+        return _collections.get(name)
+
+def distance_to_score(distance: float) -> float:
+    """
+    Converts a Chroma distance into the similarity score shown to the user.
+    The squared L2 distance (which Chroma uses by default) is 0 for identical vectors.
+    We convert it to a "similarity score" from 0 to 1: Similarity = 1 / (1 + Distance)
+    """
+    return 1 / (1 + distance)
+
+def cosine_to_score(cosine: float) -> float:
+    """
+    Converts a cosine similarity between normalized vectors into the same score
+    scale as `distance_to_score`, since for unit vectors the squared L2
+    distance equals 2 - 2 * cosine.
+    """
+    return distance_to_score(max(0.0, 2 - 2 * cosine))
 
 def add_embedding(resource_id: int, embedding: np.ndarray, metadata: dict):
     """
@@ -29,6 +190,7 @@ def add_embedding(resource_id: int, embedding: np.ndarray, metadata: dict):
         embedding (np.ndarray): The embedding vector generated by the NLP model.
         metadata (dict): A dictionary with additional data (title, category, etc.).
     """
+    collection = get_collection()
     if not collection:
         print("Error: La colección de ChromaDB no está disponible.")
         return
@@ -49,6 +211,140 @@ def add_embedding(resource_id: int, embedding: np.ndarray, metadata: dict):
     except Exception as e:
         print(f"Error al añadir el embedding a ChromaDB para el recurso {resource_id}: {e}")
 
+def add_embeddings(resource_ids: list, embeddings: list, metadatas: list):
+    """
+    Adds (or replaces) several embeddings in a single ChromaDB call.
+
+    Args:
+        resource_ids (list): The IDs of the resources (from SQLite).
+        embeddings (list): One np.ndarray per resource.
+        metadatas (list): One metadata dictionary per resource.
+    """
+    collection = get_collection()
+    if not collection:
+        print("Error: La colección de ChromaDB no está disponible.")
+        return
+    if not resource_ids:
+        return
+
+    try:
+        collection.upsert(
+            embeddings=[e.tolist() for e in embeddings],
+            metadatas=metadatas,
+            ids=[str(i) for i in resource_ids]
+        )
+    except Exception as e:
+        print(f"Error al añadir los embeddings a ChromaDB: {e}")
+
+def delete_embeddings(resource_ids: list):
+    """Removes several resources from the ChromaDB collection."""
+    collection = get_collection()
+    if not collection or not resource_ids:
+        return
+
+    try:
+        collection.delete(ids=[str(i) for i in resource_ids])
+    except Exception as e:
+        print(f"Error al eliminar embeddings de ChromaDB: {e}")
+
+def get_existing_ids(resource_ids: list) -> set:
+    """Returns which of the given resource IDs are present in the collection."""
+    collection = get_collection()
+    if not collection or not resource_ids:
+        return set()
+    results = collection.get(ids=[str(i) for i in resource_ids], include=[])
+    return set(results.get('ids', []))
+
+def get_embeddings(resource_ids: list) -> dict:
+    """
+    Returns the full-precision vectors the index holds for the given
+    resources, as {resource_id: np.ndarray}. Resources that are not
+    indexed are left out.
+    """
+    collection = get_collection()
+    if not collection or not resource_ids:
+        return {}
+    try:
+        results = collection.get(ids=[str(i) for i in resource_ids], include=["embeddings"])
+    except Exception as e:
+        print(f"Error al leer embeddings de ChromaDB: {e}")
+        return {}
+    return {int(i): np.asarray(e, dtype=np.float32)
+            for i, e in zip(results.get('ids', []), results.get('embeddings', []))}
+
+def iter_index_ids(page_size: int = 1000):
+    """
+    Yields the IDs stored in the collection one page at a time, so the whole
+    ID set never has to be loaded at once.
+    """
+    collection = get_collection()
+    if not collection:
+        return
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=[]).get('ids', [])
+        if not page:
+            return
+        yield page
+        offset += len(page)
+
+def iter_chunk_ids(page_size: int = 1000):
+    """Yields the IDs ("recurso_id:chunk_index") stored in the chunk collection one page at a time."""
+    chunk_collection = get_collection(CHUNK_COLLECTION_NAME)
+    if not chunk_collection:
+        return
+    offset = 0
+    while True:
+        page = chunk_collection.get(limit=page_size, offset=offset, include=[]).get('ids', [])
+        if not page:
+            return
+        yield page
+        offset += len(page)
+
+def delete_chunk_embeddings(chunk_ids: list):
+    """Removes several chunks, given by their "recurso_id:chunk_index" IDs, from the chunk collection."""
+    chunk_collection = get_collection(CHUNK_COLLECTION_NAME)
+    if not chunk_collection or not chunk_ids:
+        return
+
+    try:
+        chunk_collection.delete(ids=list(chunk_ids))
+    except Exception as e:
+        print(f"Error al eliminar fragmentos de ChromaDB: {e}")
+
+def count_embeddings() -> int:
+    """Returns the number of embeddings stored in the collection."""
+    collection = get_collection()
+    return collection.count() if collection else 0
+
+def update_metadatas(resource_ids: list, metadatas: list):
+    """
+    Merges the given fields into the metadata of several resources, keeping
+    the fields that are not given. The current metadata is read and written
+    back in one call each; resources that are not indexed are skipped.
+
+    Args:
+        resource_ids (list): The IDs of the resources (from SQLite).
+        metadatas (list): One dictionary of fields to set per resource.
+    """
+    collection = get_collection()
+    if not collection:
+        print("Error: La colección de ChromaDB no está disponible.")
+        return
+    if not resource_ids:
+        return
+
+    try:
+        updates = {str(i): metadata for i, metadata in zip(resource_ids, metadatas)}
+        current = collection.get(ids=list(updates), include=["metadatas"])
+        ids = current.get('ids', [])
+        if not ids:
+            return
+        merged = [{**(existing or {}), **updates[i]} for i, existing in zip(ids, current.get('metadatas', []))]
+        collection.update(ids=ids, metadatas=merged)
+    except Exception as e:
+        print(f"Error al actualizar los metadatos en ChromaDB: {e}")
+
 def query_similar(embedding: np.ndarray, top_k: int = 5) -> (list, list):
     """
     Searches for the 'top_k' most similar resources to a given embedding.
@@ -60,6 +356,7 @@ def query_similar(embedding: np.ndarray, top_k: int = 5) -> (list, list):
     Returns:
         tuple: A tuple containing a list of resource IDs and a list of their similarity scores.
     """
+    collection = get_collection()
     if not collection:
         print("Error: La colección de ChromaDB no está disponible.")
         return [], []
@@ -75,12 +372,122 @@ def query_similar(embedding: np.ndarray, top_k: int = 5) -> (list, list):
         ids = results.get('ids', [[]])[0]
         distances = results.get('distances', [[]])[0]
         
-        # The squared L2 distance (which Chroma uses by default) is 0 for identical vectors.
-        # We convert it to a "similarity score" from 0 to 1 to show it to the user.
-        # Similarity = 1 / (1 + Distance)
-        scores = [1 / (1 + d) for d in distances]
+        scores = [distance_to_score(d) for d in distances]
         
         return ids, scores
     except Exception as e:
         print(f"Error al realizar la consulta en ChromaDB: {e}")
         return [], []
+
+def query_nearest(embedding: np.ndarray) -> (str, float):
+    """
+    Returns the ID of the indexed resource closest to an embedding and its
+    cosine similarity (recovered from the squared L2 distance, since the
+    embeddings are normalized). Returns (None, 0.0) if nothing is indexed.
+    """
+    collection = get_collection()
+    if not collection:
+        return None, 0.0
+
+    try:
+        results = collection.query(query_embeddings=[embedding.tolist()], n_results=1)
+        ids = results.get('ids', [[]])[0]
+        distances = results.get('distances', [[]])[0]
+        if not ids:
+            return None, 0.0
+        return ids[0], 1 - distances[0] / 2
+    except Exception as e:
+        print(f"Error al realizar la consulta en ChromaDB: {e}")
+        return None, 0.0
+
+def add_chunk_embeddings(resource_id: int, first_index: int, embeddings: np.ndarray):
+    """
+    Adds a batch of document chunk embeddings of a resource to the chunk collection.
+
+    Args:
+        resource_id (int): The resource the chunks belong to.
+        first_index (int): Index of the first chunk of the batch within the document.
+        embeddings (np.ndarray): A (n, dim) matrix with one embedding per chunk.
+    """
+    upsert_chunk_embeddings([(resource_id, first_index + i) for i in range(len(embeddings))], embeddings)
+
+def upsert_chunk_embeddings(keys: list, embeddings):
+    """
+    Adds or replaces chunk embeddings in the chunk collection in a single call.
+
+    Args:
+        keys (list): One (resource_id, chunk_index) pair per chunk.
+        embeddings: One embedding per chunk (a matrix or a list of vectors).
+    """
+    chunk_collection = get_collection(CHUNK_COLLECTION_NAME)
+    if not chunk_collection:
+        print("Error: La colección de fragmentos de ChromaDB no está disponible.")
+        return
+    if not keys:
+        return
+
+    try:
+        chunk_collection.upsert(
+            embeddings=[np.asarray(e, dtype=np.float32).tolist() for e in embeddings],
+            metadatas=[{"recurso_id": int(resource_id), "chunk": int(index)} for resource_id, index in keys],
+            ids=[f"{resource_id}:{index}" for resource_id, index in keys]
+        )
+    except Exception as e:
+        print(f"Error al añadir los fragmentos a ChromaDB: {e}")
+
+def get_existing_chunk_ids(chunk_ids: list) -> set:
+    """Returns which of the given "recurso_id:chunk_index" IDs are present in the chunk collection."""
+    chunk_collection = get_collection(CHUNK_COLLECTION_NAME)
+    if not chunk_collection or not chunk_ids:
+        return set()
+    results = chunk_collection.get(ids=list(chunk_ids), include=[])
+    return set(results.get('ids', []))
+
+def query_similar_chunks(embedding: np.ndarray, top_k: int = 5, oversample: int = 4) -> (list, list):
+    """
+    Searches the document chunks most similar to an embedding and aggregates
+    the hits to the resource level (a resource scores as its best chunk).
+
+    Args:
+        embedding (np.ndarray): The search query vector.
+        top_k (int): The number of resources to return.
+        oversample (int): Chunks fetched per requested resource, since several
+            chunks of the same document usually match together.
+
+    Returns:
+        tuple: A list of resource IDs (as strings) and a list of their scores.
+    """
+    chunk_collection = get_collection(CHUNK_COLLECTION_NAME)
+    if not chunk_collection:
+        return [], []
+
+    try:
+        results = chunk_collection.query(
+            query_embeddings=[embedding.tolist()],
+            n_results=top_k * oversample,
+            include=["metadatas", "distances"]
+        )
+        best = {}
+        for metadata, distance in zip(results.get('metadatas', [[]])[0], results.get('distances', [[]])[0]):
+            resource_id = str(metadata["recurso_id"])
+            best[resource_id] = max(best.get(resource_id, 0.0), distance_to_score(distance))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [i for i, _ in ranked], [s for _, s in ranked]
+    except Exception as e:
+        print(f"Error al consultar los fragmentos en ChromaDB: {e}")
+        return [], []
+
+def merge_rankings(rankings: list, top_k: int) -> (list, list):
+    """
+    Merges several (ids, scores) rankings, keeping the best score of each ID.
+
+    Returns:
+        tuple: The merged list of IDs and their scores, best first.
+    """
+    best = {}
+    for ids, scores in rankings:
+        for resource_id, score in zip(ids, scores):
+            if score > best.get(resource_id, float('-inf')):
+                best[resource_id] = score
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [i for i, _ in ranked], [s for _, s in ranked]
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import numpy as np
+
+# Allow running the benchmark from any directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import vector_db
+from app.nlp_utils import embedding_to_blob, blob_to_embedding, EMBEDDING_DTYPES, EMBEDDING_DIM
+from app.neighbors import load_embedding_matrix, top_k_blocked, rescore_shortlist
+
+MODEL_VERSION = 'benchmark'
+
+def synthetic_corpus(n: int, dim: int, topics: int, seed: int = 0) -> np.ndarray:
+    """Normalized vectors grouped around `topics` centers, like a catalogue of related resources."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact_neighbors(matrix: np.ndarray, k: int) -> np.ndarray:
+    result = np.empty((matrix.shape[0], min(k, matrix.shape[0] - 1)), dtype=np.int64)
+    for start, idx, _ in top_k_blocked(matrix, k):
+        result[start:start + idx.shape[0]] = idx
+    return result
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / truth.size
+
+def run(dtype: str, ids: np.ndarray, matrix: np.ndarray, truth: np.ndarray, k: int, oversample: int) -> dict:
+    """Measures size, similarity error and neighbor recall of one storage format."""
+    blobs = [embedding_to_blob(v, dtype, MODEL_VERSION) for v in matrix]
+    decoded = np.stack([blob_to_embedding(b) for b in blobs])
+
+    sample = decoded[:200] @ decoded.T
+    error = float(np.abs(sample - matrix[:200] @ matrix.T).max())
+
+    start = time.perf_counter()
+    approx = exact_neighbors(decoded, k)
+    elapsed = time.perf_counter() - start
+
+    rescored = np.empty_like(approx)
+    for start_row, idx, sims in top_k_blocked(decoded, k * oversample):
+        idx, _ = rescore_shortlist(ids, start_row, idx, sims, k)
+        rescored[start_row:start_row + idx.shape[0]] = idx
+
+    bytes_per_vector = sum(len(b) for b in blobs) / len(blobs)
+    return {
+        'dtype': dtype,
+        'bytes': bytes_per_vector,
+        'gb_per_million': bytes_per_vector * 1e6 / 1024 ** 3,
+        'max_error': error,
+        'recall': recall(approx, truth),
+        'recall_rescored': recall(rescored, truth),
+        'seconds': elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall / memory trade-off of the embedding storage formats.")
+    parser.add_argument('--db', help="SQLite database to take the embeddings from (default: a synthetic corpus).")
+    parser.add_argument('-n', type=int, default=5000, help="Size of the synthetic corpus.")
+    parser.add_argument('--topics', type=int, default=50, help="Clusters in the synthetic corpus.")
+    parser.add_argument('-k', type=int, default=5, help="Neighbors per resource.")
+    parser.add_argument('--oversample', type=int, default=4, help="Shortlist size as a multiple of k.")
+    args = parser.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        ids, matrix = load_embedding_matrix(conn)
+        conn.close()
+    else:
+        matrix = synthetic_corpus(args.n, EMBEDDING_DIM, args.topics)
+        ids = np.arange(1, matrix.shape[0] + 1)
+
+    # The full-precision vectors used for rescoring live in the vector index.
+    vector_db.configure('memory')
+    for start in range(0, len(ids), 1000):
+        vector_db.add_embeddings(ids[start:start + 1000].tolist(), list(matrix[start:start + 1000]),
+                                 [{}] * len(ids[start:start + 1000]))
+
+    truth = exact_neighbors(matrix, args.k)
+    print(f"{len(ids)} vectors of {matrix.shape[1]} dimensions, recall@{args.k}, "
+          f"rescoring {args.k * args.oversample} candidates.")
+    print(f"{'dtype':<8} {'bytes/vec':>10} {'GB/1M':>8} {'max err':>9} {'recall':>8} {'rescored':>9} {'top-k s':>8}")
+    for dtype in EMBEDDING_DTYPES:
+        r = run(dtype, ids, matrix, truth, args.k, args.oversample)
+        print(f"{r['dtype']:<8} {r['bytes']:>10.0f} {r['gb_per_million']:>8.2f} {r['max_error']:>9.5f} "
+              f"{r['recall']:>8.4f} {r['recall_rescored']:>9.4f} {r['seconds']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import argparse
+import threading
+import statistics
+
+# Allow running the benchmark from any directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash
+from app import create_app
+from app.migrations import migrate
+from config import TestingConfig
+
+EMAIL = 'bench@alumno.buap.mx'
+PASSWORD = 'PasswordBench123!'
+
+def run(method: str, workers: int, clients: int, logins: int) -> dict:
+    """
+    Measures login throughput and latency for one hash method, with
+    `clients` concurrent test clients performing `logins` logins each.
+    """
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+
+    class BenchConfig(TestingConfig):
+        DATABASE_URL = db_path
+        PASSWORD_HASH_METHOD = method
+        PASSWORD_HASH_WORKERS = workers
+
+    app, _ = create_app(config_class=BenchConfig)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    conn.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)",
+                 (EMAIL, generate_password_hash(PASSWORD, method=method)))
+    conn.commit()
+    conn.close()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = client.post('/login', data={'email': EMAIL, 'password': PASSWORD})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 302, response.status_code
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+    os.remove(db_path)
+
+    latencies.sort()
+    return {
+        'method': method,
+        'logins_per_second': len(latencies) / total,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput benchmark.")
+    parser.add_argument('--methods', nargs='+',
+                        default=['scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'],
+                        help="Werkzeug hash methods to compare.")
+    parser.add_argument('--workers', type=int, default=2, help="Password hashing threads.")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent clients.")
+    parser.add_argument('--logins', type=int, default=10, help="Logins per client.")
+    args = parser.parse_args()
+
+    print(f"{'method':<24} {'logins/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for method in args.methods:
+        r = run(method, args.workers, args.clients, args.logins)
+        print(f"{r['method']:<24} {r['logins_per_second']:>10.1f} {r['p50_ms']:>10.1f} {r['p99_ms']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
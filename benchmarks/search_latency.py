@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import argparse
+import statistics
+import numpy as np
+
+# Allow running the benchmark from any directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash
+from app import create_app
+from app.migrations import migrate
+from app.nlp_utils import generar_embedding, embedding_to_blob
+from app.vector_db import add_embeddings
+from app.display_cache import display_cache
+from config import TestingConfig
+
+EMAIL = 'bench@alumno.buap.mx'
+PASSWORD = 'PasswordBench123!'
+WORDS = ("álgebra cálculo python redes química orgánica historia arte música biología célula física "
+         "energía literatura poesía diseño web idiomas inglés geometría estadística datos").split()
+
+def seed(db_path: str, n: int, seed: int = 0):
+    """Creates `n` resources with stub embeddings, in SQLite and in the in-memory vector store."""
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    conn.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)",
+                 (EMAIL, generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')))
+    for start in range(0, n, 1000):
+        rows, vectors = [], []
+        for i in range(start, min(n, start + 1000)):
+            titulo = ' '.join(rng.choice(WORDS, 4))
+            descripcion = ' '.join(rng.choice(WORDS, 80))
+            vector = generar_embedding(f"{titulo} {descripcion}")
+            rows.append((i + 1, titulo, descripcion, 'arte', f'https://example.org/{i}', embedding_to_blob(vector)))
+            vectors.append(vector)
+        conn.executemany("INSERT INTO recursos (id, titulo, descripcion, categoria, enlace, embedding) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        add_embeddings([r[0] for r in rows], vectors, [{"titulo": r[1], "categoria": r[3]} for r in rows])
+    conn.commit()
+    conn.close()
+
+def legacy_get_many(resource_ids: list, connect) -> dict:
+    """
+    The result assembly the search route used before the display cache:
+    every column of the ranked rows (embedding BLOBs included) read with
+    SELECT * and turned into dicts, which the route then walks in ranking order.
+    """
+    conn = connect()
+    placeholders = ', '.join('?' for _ in resource_ids)
+    query_sql = f"SELECT * FROM recursos WHERE id IN ({placeholders})"
+    recursos_dict = {r['id']: dict(r) for r in conn.execute(query_sql, list(resource_ids)).fetchall()}
+    conn.close()
+    return recursos_dict
+
+# Benchmark modes: how the results page gets the fields of the ranked resources.
+MODES = {
+    'select *': 'the old SELECT * ... WHERE id IN (...) on every search (baseline)',
+    'no cache': 'the display cache with no entries: display columns only, always from SQLite',
+    'display cache': 'the display cache, warm',
+}
+
+def run(n: int, queries: int, k: int, mode: str) -> dict:
+    """Measures the latency of the search route, and of its result assembly alone, in one mode."""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+
+    class BenchConfig(TestingConfig):
+        DATABASE_URL = db_path
+        DISPLAY_CACHE_MAX_ENTRIES = 100000 if mode == 'display cache' else 0
+        DISPLAY_CACHE_SYNC_INTERVAL = 1.0
+
+    app, _ = create_app(config_class=BenchConfig)
+    seed(db_path, n)
+    client = app.test_client()
+    client.post('/login', data={'email': EMAIL, 'password': PASSWORD})
+
+    # Time the assembly step on its own, whichever implementation is in use.
+    assemble = legacy_get_many if mode == 'select *' else display_cache.get_many
+    assembly = []
+    def timed_get_many(resource_ids, connect):
+        start = time.perf_counter()
+        result = assemble(resource_ids, connect)
+        assembly.append(time.perf_counter() - start)
+        return result
+    display_cache.get_many = timed_get_many
+
+    rng = np.random.default_rng(1)
+    texts = [' '.join(rng.choice(WORDS, 3)) for _ in range(queries)]
+    # Warm-up: fill the search cache (rankings) and, when enabled, the display cache.
+    for q in texts:
+        client.get('/buscar_semantico', query_string={'q': q, 'k': k})
+    display_cache.hits = display_cache.misses = 0
+    assembly.clear()
+
+    latencies = []
+    for q in texts:
+        start = time.perf_counter()
+        response = client.get('/buscar_semantico', query_string={'q': q, 'k': k})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    del display_cache.get_many
+    os.remove(db_path)
+
+    latencies.sort()
+    assembly.sort()
+    return {
+        'mode': mode,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        'assembly_p50_ms': statistics.median(assembly) * 1000,
+        'assembly_p99_ms': assembly[max(0, int(len(assembly) * 0.99) - 1)] * 1000,
+        'hit_rate': display_cache.hits / max(1, display_cache.hits + display_cache.misses),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic search latency before and after the display cache.")
+    parser.add_argument('-n', type=int, default=20000, help="Resources in the catalogue.")
+    parser.add_argument('--queries', type=int, default=500, help="Distinct queries measured.")
+    parser.add_argument('-k', type=int, default=20, help="Results per query.")
+    args = parser.parse_args()
+
+    # Rankings come from the search cache after the warm-up, so the numbers
+    # isolate the assembly of the results page.
+    results = [run(args.n, args.queries, args.k, mode) for mode in MODES]
+    print(f"{args.n} resources, {args.queries} queries, k={args.k}, stub NLP and in-memory vectors.")
+    for mode, description in MODES.items():
+        print(f"  {mode}: {description}")
+    print(f"{'mode':<14} {'p50 ms':>8} {'p99 ms':>8} {'assembly p50':>13} {'assembly p99':>13} {'hit rate':>9}")
+    for r in results:
+        print(f"{r['mode']:<14} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['assembly_p50_ms']:>13.3f} "
+              f"{r['assembly_p99_ms']:>13.3f} {r['hit_rate']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import sqlite3
+import sys
+import json
+import base64
+import argparse
+import numpy as np
+
+from app.nlp_utils import parse_embedding_blob, embedding_to_blob
+from app.vector_db import add_embeddings
+from app.search_cache import record_changes
+from config import Config
+
+# Parquet support is optional: JSONL works without extra dependencies.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+# Keyset page of the catalogue for export, and the CIDs already present on import.
+EXPORT_PAGE_SQL = "SELECT id, {columns}, embedding FROM recursos WHERE id > ? ORDER BY id LIMIT ?"
+EXISTING_CIDS_SQL = "SELECT cid FROM recursos WHERE cid IN ({placeholders})"
+
+# Columns of `recursos` that travel with the catalogue. The user is not
+# exported because user IDs are local to each campus.
+FIELDS = ['titulo', 'descripcion', 'categoria', 'enlace', 'cid', 'filename', 'created_at']
+
+def pack_embedding(blob) -> (bytes, str):
+    """
+    Converts a stored embedding into packed little-endian float32 bytes and
+    the version of the model that produced it (None if it was not tagged).
+    """
+    if blob is None:
+        return None, None
+    vector, _, model_version = parse_embedding_blob(blob)
+    return vector.astype('<f4').tobytes(), model_version
+
+def unpack_embedding(packed):
+    """Converts packed float32 bytes back into a vector."""
+    if packed is None:
+        return None
+    return np.frombuffer(packed, dtype='<f4').astype(np.float32)
+
+def iter_rows(conn, batch_size: int):
+    """Yields the catalogue in batches of dicts, reading one batch at a time (keyset pagination)."""
+    last_id = 0
+    sql = EXPORT_PAGE_SQL.format(columns=', '.join(FIELDS))
+    while True:
+        rows = conn.execute(sql, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        batch = []
+        for r in rows:
+            row = dict(zip(FIELDS, r[1:-1]))
+            row['embedding'], row['model_version'] = pack_embedding(r[-1])
+            batch.append(row)
+        yield batch
+        last_id = rows[-1][0]
+
+def _parquet_schema():
+    return pa.schema([(field, pa.string()) for field in FIELDS + ['model_version']] + [('embedding', pa.binary())])
+
+def _require_parquet():
+    if pq is None:
+        print("El formato Parquet requiere pyarrow: pip install pyarrow")
+        sys.exit(1)
+
+def export_catalogue(conn, path: str, fmt: str, batch_size: int = 500) -> int:
+    """
+    Streams every resource into a JSONL or Parquet file.
+    In JSONL the embedding is base64-encoded packed float32; in Parquet it is
+    a binary column with the same bytes. The model that produced each
+    embedding travels in `model_version`. Memory use is one batch.
+
+    Returns:
+        int: The number of resources exported.
+    """
+    count = 0
+    if fmt == 'parquet':
+        _require_parquet()
+        schema = _parquet_schema()
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in iter_rows(conn, batch_size):
+                for row in batch:
+                    row['created_at'] = str(row['created_at']) if row['created_at'] is not None else None
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        return count
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for batch in iter_rows(conn, batch_size):
+            for row in batch:
+                if row['embedding'] is not None:
+                    row['embedding'] = base64.b64encode(row['embedding']).decode('ascii')
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += len(batch)
+    return count
+
+def read_batches(path: str, fmt: str, batch_size: int):
+    """Yields the rows of an exported catalogue in batches, without loading the whole file."""
+    if fmt == 'parquet':
+        _require_parquet()
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield record_batch.to_pylist()
+        return
+
+    batch = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if row.get('embedding') is not None:
+                row['embedding'] = base64.b64decode(row['embedding'])
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def import_batch(conn, batch: list, user_id=None) -> (int, int):
+    """
+    Inserts one batch with a single `executemany` and upserts its vectors in
+    one call. Rows whose CID is already in the catalogue are skipped.
+    Embeddings keep the model version they were exported with; only rows
+    without one are taken as produced by the local model.
+    IDs are assigned up front inside a write transaction so the new rows
+    can be matched with their vectors.
+
+    Returns:
+        tuple: (rows imported, rows skipped).
+    """
+    cids = {row['cid'] for row in batch if row.get('cid')}
+    existing = set()
+    if cids:
+        placeholders = ', '.join('?' for _ in cids)
+        existing = {r[0] for r in conn.execute(EXISTING_CIDS_SQL.format(placeholders=placeholders), list(cids))}
+
+    rows = []
+    for row in batch:
+        cid = row.get('cid')
+        if cid and cid in existing:
+            continue
+        if cid:
+            existing.add(cid)
+        rows.append(row)
+    if not rows:
+        return 0, len(batch)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM recursos").fetchone()[0]
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'recursos'").fetchone()
+        first_id = max(max_id, seq[0] if seq else 0) + 1
+
+        vectors = [unpack_embedding(row.get('embedding')) for row in rows]
+        conn.executemany(
+            """
+            INSERT INTO recursos (id, titulo, descripcion, categoria, enlace, cid, filename, created_at, embedding, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+            """,
+            [(first_id + i, row['titulo'], row.get('descripcion'), row.get('categoria'), row.get('enlace'),
+              row.get('cid'), row.get('filename'), row.get('created_at'),
+              embedding_to_blob(vector, model_version=row.get('model_version')) if vector is not None else None,
+              user_id)
+             for i, (row, vector) in enumerate(zip(rows, vectors))]
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    indexed = [(first_id + i, row, vector) for i, (row, vector) in enumerate(zip(rows, vectors)) if vector is not None]
+    add_embeddings(
+        [resource_id for resource_id, _, _ in indexed],
+        [vector for _, _, vector in indexed],
+        [{"titulo": row['titulo'], "categoria": row.get('categoria') or "Unclassified"} for _, row, _ in indexed]
+    )
+    # Searches run before the vectors existed must not stay cached.
+    record_changes(conn, [resource_id for resource_id, _, _ in indexed])
+    return len(rows), len(batch) - len(rows)
+
+def import_catalogue(conn, path: str, fmt: str, batch_size: int = 500, user_id=None) -> (int, int):
+    """
+    Streams an exported catalogue into the database, batch by batch, so
+    memory use does not depend on the size of the file. No model inference
+    or IPFS upload is needed: categories and embeddings come with the rows.
+
+    Returns:
+        tuple: (rows imported, rows skipped because their CID already exists).
+    """
+    imported = skipped = 0
+    for batch in read_batches(path, fmt, batch_size):
+        done, dup = import_batch(conn, batch, user_id)
+        imported += done
+        skipped += dup
+        print(f"Imported {imported} resources ({skipped} already present).")
+    return imported, skipped
+
+def detect_format(path: str, fmt: str = None) -> str:
+    return fmt or ('parquet' if path.endswith('.parquet') else 'jsonl')
+
+def main():
+    """
+    Exports or imports the resource catalogue, e.g. to move it between campuses.
+    After an import, run precompute_similares.py to rebuild the related resources.
+    """
+    parser = argparse.ArgumentParser(description="Export or import the resource catalogue.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name in ('export', 'import'):
+        sub = subparsers.add_parser(name)
+        sub.add_argument('path', help="JSONL or Parquet file.")
+        sub.add_argument('--format', choices=['jsonl', 'parquet'], help="Defaults to the file extension.")
+        sub.add_argument('--batch-size', type=int, default=500, help="Rows per batch.")
+    subparsers.choices['import'].add_argument('--user-id', type=int, help="Owner assigned to the imported resources.")
+    args = parser.parse_args()
+
+    fmt = detect_format(args.path, args.format)
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        if args.command == 'export':
+            count = export_catalogue(conn, args.path, fmt, args.batch_size)
+            print(f"Exported {count} resources to {args.path}.")
+        else:
+            imported, skipped = import_catalogue(conn, args.path, fmt, args.batch_size, args.user_id)
+            print(f"\nImport complete. {imported} resources imported, {skipped} skipped.")
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error accessing SQLite database: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,63 @@
 import sqlite3
-import requests
+import asyncio
+import httpx
+from app.http_client import AsyncHttpClient, CircuitOpenError
 from config import Config
 
 # Get the database file path from our central config.
 DB_FILE = Config.DATABASE_URL
 
-def check_all_cids():
+# Number of CIDs read from the database and checked concurrently per batch.
+BATCH_SIZE = 200
+
+# Keyset page of the resources that have a CID.
+CIDS_PAGE_SQL = "SELECT id, cid, filename FROM recursos WHERE cid IS NOT NULL AND id > ? ORDER BY id LIMIT ?"
+
+async def check_cid(client, cid, filename):
+    """Checks a single CID and prints a line if it is not available."""
+    url = Config.IPFS_GATEWAY_URL.format(cid=cid, filename=filename)
+    try:
+        # We use a HEAD request because it's faster, we only want the status
+        response = await client.request("HEAD", url, key="ipfs-gateway", timeout=10)
+        if response.status_code != 200:
+            print(f"[FAILED] CID: {cid} | Status: {response.status_code}")
+    except CircuitOpenError as e:
+        print(f"[SKIPPED] CID: {cid} | {e}")
+    except httpx.HTTPError as e:
+        print(f"[ERROR] CID: {cid} | Could not connect: {e}")
+
+async def check_all_cids(client=None):
     """
     Checks the status of all CIDs stored in the database.
     It sends a HEAD request to the IPFS gateway to verify if the content is available.
+    Requests run concurrently through the shared async client, which caps how
+    many hit the gateway at once and stops early if the gateway is failing.
     """
+    client = client or AsyncHttpClient(
+        max_connections=Config.HTTP_MAX_CONNECTIONS,
+        per_host_limit=Config.HTTP_PER_HOST_LIMIT,
+        timeout=Config.HTTP_TIMEOUT,
+        failure_threshold=Config.HTTP_CIRCUIT_FAILURES,
+        reset_timeout=Config.HTTP_CIRCUIT_RESET,
+    )
     # Connect to the SQLite database
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
-    # Get all CIDs from the database
-    cids_to_check = conn.execute("SELECT cid, filename FROM recursos WHERE cid IS NOT NULL").fetchall()
-    conn.close()
-
-    print(f"Verifying {len(cids_to_check)} CIDs...")
-
-    for recurso in cids_to_check:
-        cid = recurso['cid']
-        filename = recurso['filename']
-        url = f"https://{cid}.ipfs.w3s.link/{filename}"
+    total = conn.execute("SELECT COUNT(*) FROM recursos WHERE cid IS NOT NULL").fetchone()[0]
+    print(f"Verifying {total} CIDs...")
 
-        try:
-            # We use a HEAD request because it's faster, we only want the status
-            response = requests.head(url, timeout=10)
-            if response.status_code != 200:
-                print(f"[FAILED] CID: {cid} | Status: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"[ERROR] CID: {cid} | Could not connect: {e}")
+    # Read the CIDs in batches so a large catalogue is never loaded at once
+    last_id = 0
+    try:
+        while True:
+            batch = conn.execute(CIDS_PAGE_SQL, (last_id, BATCH_SIZE)).fetchall()
+            if not batch:
+                break
+            await asyncio.gather(*(check_cid(client, r['cid'], r['filename']) for r in batch))
+            last_id = batch[-1]['id']
+    finally:
+        conn.close()
+        await client.aclose()
 
 if __name__ == '__main__':
-    check_all_cids()
\ No newline at end of file
+    asyncio.run(check_all_cids())
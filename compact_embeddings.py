@@ -0,0 +1,101 @@
+import sqlite3
+import sys
+import argparse
+
+from app.nlp_utils import parse_embedding_blob, embedding_to_blob, EMBEDDING_DTYPES
+from app.vector_db import get_embeddings
+from app.neighbors import EMBEDDINGS_PAGE_SQL
+from config import Config
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+# Keyset page of the document chunks, in primary key order.
+CHUNKS_PAGE_SQL = """
+    SELECT recurso_id, chunk_index, embedding FROM recursos_chunks
+    WHERE (recurso_id, chunk_index) > (?, ?) ORDER BY recurso_id, chunk_index LIMIT ?
+"""
+
+def convert_blob(blob: bytes, dtype: str, full=None) -> bytes:
+    """
+    Re-encodes one embedding BLOB in `dtype`, keeping its model tag.
+    `full` is the full-precision vector from the index, used instead of the
+    stored one when available so converting never compounds rounding errors.
+    """
+    vector, current, model_version = parse_embedding_blob(blob)
+    if current == dtype and model_version is not None:
+        return None
+    return embedding_to_blob(vector if full is None else full, dtype, model_version)
+
+def compact_resources(conn, dtype: str, batch_size: int = 500) -> (int, int):
+    """
+    Rewrites the embeddings of `recursos` in `dtype`, one keyset batch per
+    transaction.
+
+    Returns:
+        tuple: (BLOBs rewritten, bytes saved).
+    """
+    rewritten = saved = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(EMBEDDINGS_PAGE_SQL, (last_id, batch_size)).fetchall()
+        if not rows:
+            return rewritten, saved
+        full = get_embeddings([r[0] for r in rows])
+        updates = []
+        for resource_id, blob in rows:
+            new_blob = convert_blob(blob, dtype, full.get(resource_id))
+            if new_blob is not None:
+                updates.append((new_blob, resource_id))
+                saved += len(blob) - len(new_blob)
+        conn.executemany("UPDATE recursos SET embedding = ? WHERE id = ?", updates)
+        conn.commit()
+        rewritten += len(updates)
+        last_id = rows[-1][0]
+
+def compact_chunks(conn, dtype: str, batch_size: int = 500) -> (int, int):
+    """Rewrites the document chunk embeddings in `dtype`, like `compact_resources`."""
+    rewritten = saved = 0
+    last_key = (0, -1)
+    while True:
+        rows = conn.execute(CHUNKS_PAGE_SQL, last_key + (batch_size,)).fetchall()
+        if not rows:
+            return rewritten, saved
+        updates = []
+        for resource_id, chunk_index, blob in rows:
+            new_blob = convert_blob(blob, dtype)
+            if new_blob is not None:
+                updates.append((new_blob, resource_id, chunk_index))
+                saved += len(blob) - len(new_blob)
+        conn.executemany("UPDATE recursos_chunks SET embedding = ? WHERE recurso_id = ? AND chunk_index = ?", updates)
+        conn.commit()
+        rewritten += len(updates)
+        last_key = (rows[-1][0], rows[-1][1])
+
+def main():
+    """
+    Converts the embeddings already stored in SQLite to another format, e.g.
+    after setting EMBEDDING_STORAGE_DTYPE=int8. New resources are written in
+    the configured format on upload. Run VACUUM afterwards to give the
+    space back to the file system.
+    """
+    parser = argparse.ArgumentParser(description="Convert the stored embeddings to another format.")
+    parser.add_argument('--dtype', choices=list(EMBEDDING_DTYPES), default=Config.EMBEDDING_STORAGE_DTYPE,
+                        help="Target format (defaults to EMBEDDING_STORAGE_DTYPE).")
+    parser.add_argument('--batch-size', type=int, default=500, help="Rows per transaction.")
+    args = parser.parse_args()
+
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        resources, saved = compact_resources(conn, args.dtype, args.batch_size)
+        chunks, saved_chunks = compact_chunks(conn, args.dtype, args.batch_size)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error accessing SQLite database: {e}")
+        sys.exit(1)
+
+    print(f"Converted {resources} resource and {chunks} chunk embeddings to {args.dtype} "
+          f"({(saved + saved_chunks) / 1024 ** 2:.1f} MB saved).")
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,85 @@ class Config:
     
     # API Token for Web3.Storage (IPFS).
     WEB3_STORAGE_TOKEN = os.environ.get('WEB3_STORAGE_TOKEN')
+    # IPFS endpoints: the pinning service and the public gateway URL template.
+    IPFS_UPLOAD_URL = os.environ.get('IPFS_UPLOAD_URL', 'https://api.web3.storage/upload')
+    IPFS_GATEWAY_URL = os.environ.get('IPFS_GATEWAY_URL', 'https://{cid}.ipfs.w3s.link/{filename}')
+    IPFS_UPLOAD_TIMEOUT = 120
+
+    # Local read-through cache of files downloaded from the IPFS gateway.
+    IPFS_CACHE_DIR = os.environ.get('IPFS_CACHE_DIR', 'ipfs_cache')
+    IPFS_CACHE_MAX_BYTES = int(os.environ.get('IPFS_CACHE_MAX_BYTES', 1024 ** 3))
+    # Let a front-end server (e.g. nginx) send cached files with X-Sendfile.
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
+
+    # Password hashing: Werkzeug method string (e.g. 'scrypt:16384:8:1' or
+    # 'pbkdf2:sha256:600000'). Stored hashes made with another method are
+    # upgraded on the next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    # Threads that may hash at the same time, and seconds a request waits for one.
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Number of reverse proxies in front of the app (e.g. nginx serving
+    # X-Sendfile). Their X-Forwarded-* headers are trusted so that
+    # `request.remote_addr` is the client's address, which the login rate
+    # limit is keyed on. Leave it at 0 when the app is reached directly.
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+    # Authentication attempts allowed as (attempts, seconds).
+    LOGIN_RATE_LIMIT_PER_IP = (20, 60)
+    LOGIN_RATE_LIMIT_PER_EMAIL = (5, 60)
+
+    # Shared outbound HTTP client: pool size, concurrent requests per service,
+    # default timeout (seconds) and circuit breaker (failures before opening,
+    # seconds before retrying).
+    HTTP_MAX_CONNECTIONS = 20
+    HTTP_PER_HOST_LIMIT = int(os.environ.get('HTTP_PER_HOST_LIMIT', 4))
+    HTTP_TIMEOUT = 30
+    HTTP_CIRCUIT_FAILURES = 5
+    HTTP_CIRCUIT_RESET = 30
+
+    # Model and vector store backends. 'stub' and 'memory' need no model
+    # download and write nothing to disk, for tests and quick local runs.
+    NLP_BACKEND = os.environ.get('NLP_BACKEND', 'transformers')
+    VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'chroma')
+    # Folder of the persistent Chroma database.
+    CHROMA_PATH = os.environ.get('CHROMA_PATH', 'chroma_db')
+
+    # Format of the embeddings stored in SQLite: 'float32', 'float16' (half
+    # the size) or 'int8' (a quarter). With a compact format, bulk jobs
+    # shortlist `RESCORE_OVERSAMPLE` times more candidates and rescore them
+    # with the full-precision vectors of the vector index.
+    EMBEDDING_STORAGE_DTYPE = os.environ.get('EMBEDDING_STORAGE_DTYPE', 'float32')
+    RESCORE_OVERSAMPLE = 4
+
+    # Semantic search results cache (entries are ranked IDs and scores).
+    SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 1024))
+    SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 300))
+    # Upper bound for the number of results a single search may request.
+    SEARCH_MAX_K = 50
+
+    # Display fields of resources kept in memory to render search results
+    # (entries, characters of description kept, seconds between checks of
+    # the change log written by other processes).
+    DISPLAY_CACHE_MAX_ENTRIES = int(os.environ.get('DISPLAY_CACHE_MAX_ENTRIES', 100000))
+    DISPLAY_CACHE_DESCRIPTION_CHARS = 300
+    DISPLAY_CACHE_SYNC_INTERVAL = 1.0
+
+    # Number of related resources precomputed and shown for each resource.
+    NEIGHBORS_TOP_K = 5
+
+    # Chunked indexing of uploaded documents (sizes are in model tokens).
+    CHUNK_WINDOW_TOKENS = 256
+    CHUNK_OVERLAP_TOKENS = 64
+    CHUNK_BATCH_SIZE = 16
+    CHUNK_MAX_PER_DOCUMENT = 128
+    CHUNK_TEXT_BLOCK_CHARS = 64 * 1024
+    # Background threads that index uploaded documents.
+    CHUNK_INDEX_WORKERS = int(os.environ.get('CHUNK_INDEX_WORKERS', 1))
+
+    # Cosine similarity from which a new resource is flagged as a near-duplicate.
+    DUPLICATE_SIMILARITY_THRESHOLD = float(os.environ.get('DUPLICATE_SIMILARITY_THRESHOLD', 0.97))
 
 class DevelopmentConfig(Config):
     """Configuration for the development environment."""
@@ -29,4 +108,13 @@ class TestingConfig(Config):
     # Use a separate database for tests to avoid data corruption.
     DATABASE_URL = 'test_rea.db'
     # Disable CSRF protection in forms during tests for simplicity.
-    WTF_CSRF_ENABLED = False
\ No newline at end of file
+    WTF_CSRF_ENABLED = False
+    # Deterministic embeddings and an in-memory vector store: no model
+    # loading and no chroma_db folder.
+    NLP_BACKEND = 'stub'
+    VECTOR_BACKEND = 'memory'
+    # Tests write to the database directly, so check the change log on every read.
+    DISPLAY_CACHE_SYNC_INTERVAL = 0
+    # Every test request comes from the same address.
+    LOGIN_RATE_LIMIT_PER_IP = (10000, 60)
+    LOGIN_RATE_LIMIT_PER_EMAIL = (10000, 60)
\ No newline at end of file
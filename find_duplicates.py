@@ -0,0 +1,36 @@
+import sqlite3
+import sys
+import argparse
+from app.duplicates import find_duplicate_groups
+from config import Config
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+def main():
+    """
+    Clusters the existing catalogue into groups of near-duplicate resources
+    (blocked cosine similarity over the stored embeddings) and links every
+    member of a group to the oldest resource of the group.
+    """
+    parser = argparse.ArgumentParser(description="Find groups of near-duplicate resources.")
+    parser.add_argument('--threshold', type=float, default=Config.DUPLICATE_SIMILARITY_THRESHOLD,
+                        help="Cosine similarity from which two resources are duplicates.")
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help="Rows per block of the similarity computation (bounds peak memory).")
+    args = parser.parse_args()
+
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        groups = find_duplicate_groups(conn, args.threshold, args.block_size)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error reading SQLite database: {e}")
+        sys.exit(1)
+
+    for group in groups:
+        print(f"[DUPLICATES] Original: {group[0]} | Copies: {', '.join(str(i) for i in group[1:])}")
+    print(f"\nFound {len(groups)} groups of near-duplicates.")
+
+if __name__ == '__main__':
+    main()
@@ -1,40 +1,15 @@
 import sqlite3
 from config import Config
+from app.migrations import migrate
 
 # Get the database file path from our central config.
 DB_FILE = Config.DATABASE_URL
 conn = sqlite3.connect(DB_FILE)
-cur = conn.cursor()
 
-# Create the 'recursos' table if it doesn't exist
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS recursos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    titulo TEXT NOT NULL,
-    descripcion TEXT,
-    categoria TEXT,
-    enlace TEXT,
-    cid TEXT,
-    filename TEXT,
-    embedding BLOB,
-    user_id INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES usuarios (id)
-    )
-""")
+# Create the tables, or bring an existing database up to date, by applying
+# the pending schema migrations (see app/migrations.py).
+version = migrate(conn)
 
-# Create the 'usuarios' table if it doesn't exist
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS usuarios (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    email TEXT NOT NULL UNIQUE,
-    password_hash TEXT NOT NULL,
-    role TEXT NOT NULL DEFAULT 'user'
-    )
-""")
-
-# Commit the changes and close the connection
-conn.commit()
+# Close the connection
 conn.close()
-print(f"Database initialized: {DB_FILE}")
-
+print(f"Database initialized: {DB_FILE} (schema version {version})")
@@ -0,0 +1,35 @@
+import sqlite3
+import sys
+import argparse
+from app.neighbors import precompute_all, DEFAULT_TOP_K
+from config import Config
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+def main():
+    """
+    Recomputes the list of related resources of every resource from the
+    stored embeddings (all-pairs top-k in blocked matrix multiplications).
+    New resources keep their lists up to date incrementally, so this only
+    needs to run after bulk changes or to rebuild the table from scratch.
+    """
+    parser = argparse.ArgumentParser(description="Precompute related resources for the whole catalogue.")
+    parser.add_argument('-k', type=int, default=Config.NEIGHBORS_TOP_K or DEFAULT_TOP_K,
+                        help="Number of related resources per resource.")
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help="Rows per block of the similarity computation (bounds peak memory).")
+    args = parser.parse_args()
+
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        written = precompute_all(conn, k=args.k, block_size=args.block_size)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error reading SQLite database: {e}")
+        sys.exit(1)
+
+    print(f"Related resources computed for {written} resources.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import sqlite3
+import sys
+import os
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.nlp_utils import clasificar_lote, get_backend, TransformersBackend, SIN_CLASIFICAR
+from app.vector_db import update_metadatas
+from config import Config
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+# File where the progress is saved so an interrupted run can resume.
+CHECKPOINT_FILE = 'reclassify.checkpoint'
+
+# Keyset page of the resources to reclassify; see `batch_query` for the condition.
+BATCH_SQL = "SELECT id, titulo, descripcion FROM recursos WHERE {condition} AND id > ? ORDER BY id LIMIT ?"
+
+def batch_query(reclassify_all: bool, include_manual: bool = False) -> (str, tuple):
+    """
+    Returns the keyset query for the selected resources and its leading
+    parameters (the last ID and the batch size follow them).
+    By default only unclassified resources are selected; with `reclassify_all`
+    the whole catalogue is (e.g. after adding a label to CATEGORIAS_POSIBLES).
+    Categories chosen by hand when the resource was created are left alone
+    unless `include_manual` is set.
+    """
+    condition = "1 = 1" if reclassify_all else "(categoria IS NULL OR categoria = ?)"
+    params = () if reclassify_all else (SIN_CLASIFICAR,)
+    if not include_manual:
+        condition += " AND categoria_manual = 0"
+    return BATCH_SQL.format(condition=condition), params
+
+def iter_batches(conn, reclassify_all: bool, last_id: int, batch_size: int, include_manual: bool = False):
+    """
+    Yields batches of (id, texto) for the resources to reclassify, in ID order.
+    Uses keyset pagination so each query only reads one batch.
+    """
+    sql, params = batch_query(reclassify_all, include_manual)
+    while True:
+        rows = conn.execute(sql, params + (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        yield [(r[0], f"{r[1]} {r[2] or ''}".strip()) for r in rows]
+        last_id = rows[-1][0]
+
+def classify_batch(batch: list) -> list:
+    """Classifies one batch and returns the (categoria, id) pairs to write back."""
+    categorias = clasificar_lote([texto for _, texto in batch])
+    return [(categoria, resource_id) for (resource_id, _), categoria in zip(batch, categorias)]
+
+def write_batch(conn, results: list):
+    """
+    Writes the new categories with a single `executemany` and merges them into
+    the ChromaDB metadata of the resources that are indexed. A category
+    written here is automatic, even if it replaces one chosen by hand.
+    """
+    conn.executemany("UPDATE recursos SET categoria = ?, categoria_manual = 0 WHERE id = ?", results)
+    conn.commit()
+    update_metadatas([resource_id for _, resource_id in results],
+                     [{"categoria": categoria} for categoria, _ in results])
+
+def load_checkpoint(path: str, reclassify_all: bool, include_manual: bool = False) -> int:
+    """Returns the last ID processed by a previous run in the same mode, or 0."""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        data = json.load(f)
+    same_mode = data.get('all') == reclassify_all and data.get('manual', False) == include_manual
+    return data['last_id'] if same_mode else 0
+
+def save_checkpoint(path: str, reclassify_all: bool, last_id: int, include_manual: bool = False):
+    """Atomically records the last ID whose category was written."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'all': reclassify_all, 'manual': include_manual, 'last_id': last_id}, f)
+    os.replace(tmp_path, path)
+
+def _init_worker(threads: int, niceness: int):
+    """Limits the CPU used by each worker process."""
+    if isinstance(get_backend(), TransformersBackend):
+        import torch
+        torch.set_num_threads(threads)
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+def reclassify(conn, reclassify_all=False, batch_size=64, workers=1, threads=1, niceness=0,
+               checkpoint=CHECKPOINT_FILE, include_manual=False):
+    """
+    Reclassifies the selected resources in batches, resuming from the
+    checkpoint left by an interrupted run.
+    With more than one worker, batches are classified in a process pool with
+    at most two batches in flight per worker, and written back in ID order so
+    the checkpoint never skips a batch.
+
+    Returns:
+        int: The number of resources reclassified.
+    """
+    last_id = load_checkpoint(checkpoint, reclassify_all, include_manual)
+    if last_id:
+        print(f"Resuming after resource {last_id}.")
+    batches = iter_batches(conn, reclassify_all, last_id, batch_size, include_manual)
+
+    count = 0
+    def commit(batch, results):
+        nonlocal count
+        write_batch(conn, results)
+        save_checkpoint(checkpoint, reclassify_all, batch[-1][0], include_manual)
+        count += len(results)
+        print(f"Reclassified {count} resources (up to ID {batch[-1][0]}).")
+
+    if workers <= 1:
+        _init_worker(threads, niceness)
+        for batch in batches:
+            commit(batch, classify_batch(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(threads, niceness)) as pool:
+            in_flight = deque()
+            for batch in batches:
+                in_flight.append((batch, pool.submit(classify_batch, batch)))
+                if len(in_flight) >= workers * 2:
+                    done_batch, future = in_flight.popleft()
+                    commit(done_batch, future.result())
+            while in_flight:
+                done_batch, future = in_flight.popleft()
+                commit(done_batch, future.result())
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return count
+
+def main():
+    """
+    Reprocesses resources that were saved as unclassified (or the whole
+    catalogue with --all) with the zero-shot classifier. Categories chosen
+    by hand are only overwritten with --include-manual.
+    """
+    parser = argparse.ArgumentParser(description="Batch reclassification of resources.")
+    parser.add_argument('--all', action='store_true',
+                        help="Reclassify every resource, not only the unclassified ones.")
+    parser.add_argument('--include-manual', action='store_true',
+                        help="Also overwrite the categories chosen by hand when the resource was created.")
+    parser.add_argument('--batch-size', type=int, default=64, help="Resources per batch.")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes.")
+    parser.add_argument('--threads', type=int, default=1, help="Torch threads per worker.")
+    parser.add_argument('--nice', type=int, default=10,
+                        help="Niceness added to the workers so live traffic keeps priority.")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help="Progress file used to resume.")
+    parser.add_argument('--restart', action='store_true', help="Ignore the saved progress.")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        count = reclassify(conn, args.all, args.batch_size, args.workers, args.threads, args.nice, args.checkpoint,
+                           args.include_manual)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error reading SQLite database: {e}")
+        sys.exit(1)
+
+    print(f"\nReclassification complete. Processed {count} resources.")
+
+if __name__ == '__main__':
+    main()
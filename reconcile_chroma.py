@@ -0,0 +1,187 @@
+import sqlite3
+import sys
+import time
+import argparse
+
+from app.nlp_utils import blob_to_embedding
+from app.vector_db import add_embeddings, delete_embeddings, get_existing_ids, iter_index_ids, count_embeddings
+from app.vector_db import iter_chunk_ids, delete_chunk_embeddings, get_existing_chunk_ids, upsert_chunk_embeddings
+from app.search_cache import record_changes
+from config import Config
+
+# Get the database file path from our central config.
+DB_FILE = Config.DATABASE_URL
+
+# Keyset page of the resources that should be in the index.
+INDEXED_PAGE_SQL = "SELECT id FROM recursos WHERE embedding IS NOT NULL AND id > ? ORDER BY id LIMIT ?"
+# Rows copied into the index, and which IDs of an index page should be there.
+BACKFILL_SQL = "SELECT id, titulo, categoria, embedding FROM recursos WHERE id IN ({placeholders})"
+KNOWN_IDS_SQL = "SELECT id FROM recursos WHERE embedding IS NOT NULL AND id IN ({placeholders})"
+# Keyset page of the chunk rows of existing resources, and one chunk's stored vector.
+CHUNK_KEYS_PAGE_SQL = """
+    SELECT c.recurso_id, c.chunk_index FROM recursos_chunks c
+    JOIN recursos r ON r.id = c.recurso_id
+    WHERE (c.recurso_id, c.chunk_index) > (?, ?) ORDER BY c.recurso_id, c.chunk_index LIMIT ?
+"""
+CHUNK_EMBEDDING_SQL = "SELECT embedding FROM recursos_chunks WHERE recurso_id = ? AND chunk_index = ?"
+# Chunks of a page of the chunk collection that still have a row and a resource.
+KNOWN_CHUNKS_SQL = """
+    SELECT c.recurso_id, c.chunk_index FROM recursos_chunks c
+    JOIN recursos r ON r.id = c.recurso_id WHERE c.recurso_id IN ({placeholders})
+"""
+
+def iter_sqlite_ids(conn, chunk_size: int):
+    """Yields the IDs of the resources with an embedding, sorted, one chunk at a time."""
+    last_id = 0
+    while True:
+        rows = conn.execute(INDEXED_PAGE_SQL, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield [r[0] for r in rows]
+        last_id = rows[-1][0]
+
+def backfill(conn, resource_ids: list):
+    """Copies the given resources from SQLite into ChromaDB in a single call."""
+    placeholders = ', '.join('?' for _ in resource_ids)
+    rows = conn.execute(BACKFILL_SQL.format(placeholders=placeholders), resource_ids).fetchall()
+    add_embeddings(
+        [r[0] for r in rows],
+        [blob_to_embedding(r[3]) for r in rows],
+        [{"titulo": r[1], "categoria": r[2] or "Unclassified"} for r in rows]
+    )
+
+def iter_sqlite_chunk_keys(conn, chunk_size: int):
+    """Yields the (recurso_id, chunk_index) keys of the stored chunks, sorted, one page at a time."""
+    last_key = (0, -1)
+    while True:
+        rows = conn.execute(CHUNK_KEYS_PAGE_SQL, last_key + (chunk_size,)).fetchall()
+        if not rows:
+            return
+        yield [(r[0], r[1]) for r in rows]
+        last_key = (rows[-1][0], rows[-1][1])
+
+def backfill_chunks(conn, keys: list):
+    """Copies the given chunks from SQLite into the chunk collection in a single call."""
+    embeddings = [blob_to_embedding(conn.execute(CHUNK_EMBEDDING_SQL, key).fetchone()[0]) for key in keys]
+    upsert_chunk_embeddings(keys, embeddings)
+
+def find_orphan_chunks(conn, page: list) -> list:
+    """
+    Returns the chunk IDs of a page of the chunk collection that have no row
+    in `recursos_chunks` or whose resource no longer exists.
+    """
+    resource_ids = sorted({int(i.split(':', 1)[0]) for i in page if i.split(':', 1)[0].isdigit()})
+    known = set()
+    if resource_ids:
+        placeholders = ', '.join('?' for _ in resource_ids)
+        known = {f"{r[0]}:{r[1]}" for r in conn.execute(
+            KNOWN_CHUNKS_SQL.format(placeholders=placeholders), resource_ids
+        ).fetchall()}
+    return [i for i in page if i not in known]
+
+def reconcile(conn, chunk_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Brings ChromaDB back in line with SQLite, which is the source of truth.
+    1. SQLite IDs are streamed in sorted chunks; each chunk is checked against
+       the index and the missing resources are backfilled in one batch.
+    2. Index IDs are streamed page by page; each page is checked against
+       SQLite and the orphans (deleted resources or resources without an
+       embedding) are removed in batches once the scan is over.
+    3. The chunks are checked the same way: stored chunks whose vector is
+       missing from the chunk collection (e.g. the indexer died after
+       committing them) are backfilled, and vectors of deleted resources or
+       without a chunk row are removed.
+    Every resource repaired by any step is then written to `recursos_cambios`
+    so cached search results are invalidated.
+    Only one chunk of IDs is held in memory at a time (plus the orphan IDs).
+
+    Returns:
+        dict: Counts describing how far the stores had drifted.
+    """
+    report = {'sqlite': 0, 'index': count_embeddings(), 'missing': 0, 'orphans': 0,
+              'missing_chunks': 0, 'orphan_chunks': 0}
+
+    affected = set()
+    for chunk in iter_sqlite_ids(conn, chunk_size):
+        report['sqlite'] += len(chunk)
+        present = get_existing_ids(chunk)
+        missing = [i for i in chunk if str(i) not in present]
+        report['missing'] += len(missing)
+        if missing and not dry_run:
+            backfill(conn, missing)
+            affected.update(missing)
+
+    orphans = []
+    for page in iter_index_ids(chunk_size):
+        numeric = [int(i) for i in page if i.isdigit()]
+        placeholders = ', '.join('?' for _ in numeric)
+        known = set()
+        if numeric:
+            known = {str(r[0]) for r in conn.execute(
+                KNOWN_IDS_SQL.format(placeholders=placeholders), numeric
+            ).fetchall()}
+        orphans.extend(i for i in page if i not in known)
+    report['orphans'] = len(orphans)
+    if not dry_run:
+        for start in range(0, len(orphans), chunk_size):
+            delete_embeddings(orphans[start:start + chunk_size])
+        affected.update(int(i) for i in orphans if i.isdigit())
+
+    for keys in iter_sqlite_chunk_keys(conn, chunk_size):
+        present = get_existing_chunk_ids([f"{r}:{i}" for r, i in keys])
+        missing = [key for key in keys if f"{key[0]}:{key[1]}" not in present]
+        report['missing_chunks'] += len(missing)
+        if missing and not dry_run:
+            backfill_chunks(conn, missing)
+            affected.update(r for r, _ in missing)
+
+    orphan_chunks = []
+    for page in iter_chunk_ids(chunk_size):
+        orphan_chunks.extend(find_orphan_chunks(conn, page))
+    report['orphan_chunks'] = len(orphan_chunks)
+    if orphan_chunks and not dry_run:
+        for start in range(0, len(orphan_chunks), chunk_size):
+            delete_chunk_embeddings(orphan_chunks[start:start + chunk_size])
+        affected.update(int(i.split(':', 1)[0]) for i in orphan_chunks if i.split(':', 1)[0].isdigit())
+    if affected and not dry_run:
+        record_changes(conn, sorted(affected))
+
+    report['drift'] = (report['missing'] + report['orphans']) / max(report['sqlite'], 1)
+    return report
+
+def print_report(report: dict, dry_run: bool):
+    """Prints how far the stores had drifted and what was done about it."""
+    action = "would be" if dry_run else "were"
+    print(f"SQLite: {report['sqlite']} resources with embeddings | ChromaDB: {report['index']} vectors")
+    print(f"{report['missing']} missing vectors and {report['missing_chunks']} missing chunks {action} backfilled, "
+          f"{report['orphans']} orphan vectors and {report['orphan_chunks']} orphan chunks {action} deleted "
+          f"(drift: {report['drift']:.2%}).")
+
+def main():
+    """
+    Incremental consistency check between SQLite and ChromaDB.
+    Runs once, or every --interval seconds when scheduled.
+    """
+    parser = argparse.ArgumentParser(description="Reconcile the ChromaDB index with the SQLite database.")
+    parser.add_argument('--chunk-size', type=int, default=500, help="IDs compared per batch.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report the drift, do not repair it.")
+    parser.add_argument('--interval', type=int, default=0,
+                        help="Run again every N seconds (0 runs once).")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            report = reconcile(conn, args.chunk_size, args.dry_run)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error reading SQLite database: {e}")
+            sys.exit(1)
+
+        print_report(report, args.dry_run)
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ sys.path.insert(0, project_root)
 
 from app import create_app
 from config import TestingConfig
+from app.migrations import migrate
 
 @pytest.fixture(scope='module')
 def app():
@@ -29,34 +30,10 @@ def app():
     if os.path.exists(db_path):
         os.remove(db_path)
 
-    # Establish the test database schema within the application context.
+    # Establish the test database schema with the same migrations used in production.
     with flask_app.app_context():
         conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user'
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS recursos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                descripcion TEXT,
-                categoria TEXT,
-                enlace TEXT,
-                cid TEXT,
-                filename TEXT,
-                embedding BLOB,
-                user_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES usuarios (id)
-            )
-        """)
-        conn.commit()
+        migrate(conn)
         conn.close()
     
     yield flask_app
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from io import BytesIO
 
@@ -123,4 +124,1155 @@ def test_create_new_resource_with_mocking(client, mocker):
     assert response.status_code == 200
     assert "Recurso guardado y clasificado: matem\u00e1ticas".encode('utf-8') in response.data
     assert "Introducci\u00f3n al C\u00e1lculo".encode('utf-8') in response.data
-    assert b"Un recurso sobre derivadas e integrales." in response.data
\ No newline at end of file
+    assert b"Un recurso sobre derivadas e integrales." in response.data
+
+# --- Search Cache Tests ---
+
+def test_search_cache_eviction_and_generation():
+    """Tests LRU eviction, query normalization and generation-based invalidation."""
+    from app.search_cache import SearchCache
+
+    cache = SearchCache(max_entries=2, ttl=60)
+    key_a = cache.make_key('  Cálculo   Diferencial ', 5)
+    assert key_a == cache.make_key('cálculo diferencial', 5)
+    assert key_a != cache.make_key('cálculo diferencial', 10)
+
+    cache.set(key_a, ['1'], [0.9], 0)
+    cache.set(cache.make_key('b', 5), ['2'], [0.8], 0)
+    assert cache.get(key_a) == (['1'], [0.9])
+    # 'a' was used most recently, so adding 'c' evicts 'b'.
+    cache.set(cache.make_key('c', 5), ['3'], [0.7], 0)
+    assert cache.get(cache.make_key('b', 5)) is None
+    assert cache.get(key_a) is not None
+
+    # The same version keeps the entries; a new one drops them all.
+    cache.sync_generation(0)
+    assert cache.get(key_a) is not None
+    cache.sync_generation(1)
+    assert cache.get(key_a) is None
+    assert len(cache) == 0
+
+    # A ranking computed at an older catalogue version is not stored.
+    cache.set(key_a, ['1'], [0.9], cache.generation - 1)
+    assert cache.get(key_a) is None
+
+def test_semantic_search_uses_cache(client, mocker):
+    """
+    Tests that repeating a search skips the embedding step and that any write
+    to the catalogue, in this process or another, invalidates the cached rankings.
+    """
+    fake_embedding = np.random.rand(768).astype(np.float32)
+    mock_embedding = mocker.patch('app.routes.resources.generar_embedding', return_value=fake_embedding)
+    mocker.patch('app.routes.resources.query_similar', return_value=([], []))
+    mocker.patch('app.routes.resources.query_similar_chunks', return_value=([], []))
+    mocker.patch('app.routes.resources.clasificar_texto', return_value='física')
+    mocker.patch('app.routes.resources.add_embedding_to_chroma', return_value=None)
+
+    client.post('/register', data={'email': 'searcher@alumno.buap.mx', 'password': 'PasswordSearcher123!'})
+    client.post('/login', data={'email': 'searcher@alumno.buap.mx', 'password': 'PasswordSearcher123!'})
+
+    response = client.get('/buscar_semantico?q=Leyes+de+Newton&k=3')
+    assert response.status_code == 200
+    assert response.headers.get('ETag')
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert response.cache_control.max_age is None
+    assert b"No se encontraron resultados" in response.data
+
+    client.post('/buscar_semantico', data={'q': 'leyes de  newton', 'k': '3'})
+    assert mock_embedding.call_count == 1
+
+    # A matching ETag short-circuits the whole search.
+    response_cached = client.get('/buscar_semantico?q=Leyes+de+Newton&k=3',
+                                 headers={'If-None-Match': response.headers['ETag']})
+    assert response_cached.status_code == 304
+
+    client.post('/nuevo', data={'titulo': 'Dinámica', 'descripcion': 'Fuerzas y movimiento.'})
+    response = client.get('/buscar_semantico?q=Leyes+de+Newton&k=3')
+    # One call for the new resource and one for the invalidated search.
+    assert mock_embedding.call_count == 3
+
+    # A write from another process (e.g. a catalogue import) also changes
+    # the ETag and invalidates the cached ranking.
+    import sqlite3
+    conn = sqlite3.connect(client.application.config['DATABASE_URL'])
+    conn.execute("INSERT INTO recursos (titulo) VALUES ('Importado')")
+    conn.commit()
+    conn.close()
+    response_stale = client.get('/buscar_semantico?q=Leyes+de+Newton&k=3',
+                                headers={'If-None-Match': response.headers['ETag']})
+    assert response_stale.status_code == 200
+    assert mock_embedding.call_count == 4
+
+def test_search_cache_ignores_rankings_made_during_a_write(client, app, mocker):
+    """
+    Tests that a ranking computed while the catalogue changed is not cached,
+    and that a new resource bumps the catalogue version after its vector is
+    in the index.
+    """
+    import sqlite3
+    from app.search_cache import search_cache, catalogue_version
+
+    db_path = app.config['DATABASE_URL']
+    def version():
+        conn = sqlite3.connect(db_path)
+        try:
+            return catalogue_version(conn)
+        finally:
+            conn.close()
+
+    def concurrent_write(embedding, top_k):
+        # Another worker saves a resource and serves a search meanwhile.
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO recursos (titulo) VALUES ('Subido durante la búsqueda')")
+        conn.commit()
+        conn.close()
+        search_cache.sync_generation(version())
+        return [], []
+
+    mocker.patch('app.routes.resources.query_similar', side_effect=concurrent_write)
+    mocker.patch('app.routes.resources.query_similar_chunks', return_value=([], []))
+    client.post('/register', data={'email': 'racer@alumno.buap.mx', 'password': 'PasswordRacer123!'})
+    client.post('/login', data={'email': 'racer@alumno.buap.mx', 'password': 'PasswordRacer123!'})
+
+    client.get('/buscar_semantico?q=Termodinámica&k=3')
+    key = search_cache.make_key('Termodinámica', 3)
+    assert search_cache.get(key) is None
+
+    versions_at_index = []
+    mocker.patch('app.routes.resources.add_embedding_to_chroma',
+                 side_effect=lambda *args: versions_at_index.append(version()))
+    client.post('/nuevo', data={'titulo': 'Entropía', 'descripcion': 'Segunda ley.'})
+    assert len(versions_at_index) == 1
+    assert version() > versions_at_index[0]
+
+
+# --- Related Resources Tests ---
+
+def test_top_k_blocked_matches_brute_force():
+    """Tests that the blocked all-pairs top-k agrees with the full similarity matrix."""
+    from app.neighbors import top_k_blocked
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((37, 16)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    full = matrix @ matrix.T
+    np.fill_diagonal(full, -np.inf)
+    expected = np.argsort(-full, axis=1)[:, :4]
+
+    rows = {}
+    for start, idx, sims in top_k_blocked(matrix, k=4, block_size=8):
+        for r in range(idx.shape[0]):
+            rows[start + r] = idx[r]
+            assert np.all(np.diff(sims[r]) <= 0)
+    assert len(rows) == 37
+    for i in range(37):
+        assert list(rows[i]) == list(expected[i])
+
+def test_similares_route_uses_stored_embedding(client, mocker):
+    """
+    Tests that the related-resources page queries the vector index with the
+    stored embedding instead of running the model, and caches the neighbor list.
+    """
+    fake_embedding = np.random.rand(768).astype(np.float32)
+    mocker.patch('app.routes.resources.generar_embedding', return_value=fake_embedding)
+    mocker.patch('app.routes.resources.clasificar_texto', return_value='química')
+    mocker.patch('app.routes.resources.add_embedding_to_chroma', return_value=None)
+    mocker.patch('app.neighbors.query_similar', return_value=([], []))
+
+    client.post('/register', data={'email': 'related@alumno.buap.mx', 'password': 'PasswordRelated123!'})
+    client.post('/login', data={'email': 'related@alumno.buap.mx', 'password': 'PasswordRelated123!'})
+    client.post('/nuevo', data={'titulo': 'Tabla periódica', 'descripcion': 'Elementos químicos.'})
+    client.post('/nuevo', data={'titulo': 'Enlaces químicos', 'descripcion': 'Iónicos y covalentes.'})
+
+    with client.application.app_context():
+        from app import get_conn
+        conn = get_conn()
+        first, second = [r['id'] for r in conn.execute(
+            "SELECT id FROM recursos WHERE titulo IN ('Tabla periódica', 'Enlaces químicos') ORDER BY id").fetchall()]
+        conn.execute("DELETE FROM recursos_similares")
+        conn.commit()
+        conn.close()
+
+    mock_generar = mocker.patch('app.routes.resources.generar_embedding')
+    mock_query = mocker.patch('app.neighbors.query_similar', return_value=([str(first), str(second)], [1.0, 0.8]))
+
+    response = client.get(f'/recursos/{first}/similares')
+    assert response.status_code == 200
+    assert "Enlaces químicos".encode('utf-8') in response.data
+    mock_generar.assert_not_called()
+    assert mock_query.call_count == 1
+
+    # The second visit is served from the stored neighbor list.
+    client.get(f'/recursos/{first}/similares')
+    assert mock_query.call_count == 1
+
+    assert client.get('/recursos/999999/similares').status_code == 404
+
+
+# --- Document Chunking Tests ---
+
+def test_text_blocks_and_token_windows():
+    """
+    Tests that documents are read in blocks without cutting words and split
+    into overlapping windows, leaving the upload stream open.
+    """
+    from app.documents import iter_text_blocks, iter_token_windows
+
+    words = [f"palabra{i}" for i in range(100)]
+    stream = BytesIO(" ".join(words).encode('utf-8'))
+    blocks = list(iter_text_blocks(stream, 'apuntes.txt', block_chars=50))
+    assert len(blocks) > 1
+    assert "".join(blocks).split() == words
+    assert not stream.closed
+
+    windows = list(iter_token_windows(blocks, str.split, window=30, overlap=10))
+    assert [len(w) for w in windows] == [30, 30, 30, 30, 20]
+    assert windows[0][20:] == windows[1][:10]
+    assert windows[-1][-1] == "palabra99"
+
+    assert list(iter_text_blocks(BytesIO(b"\x00\x01"), 'imagen.png')) == []
+
+def test_index_document_batches_and_caps_chunks(app, mocker):
+    """Tests that chunk embeddings are computed in batches and capped per document."""
+    from app.documents import index_document
+
+    mocker.patch('app.documents.tokenizar', side_effect=lambda texto: texto.split())
+    embedder = mocker.patch('app.documents.generar_embeddings_ventanas',
+                            side_effect=lambda ventanas: np.ones((len(ventanas), 4), dtype=np.float32))
+    add_chunks = mocker.patch('app.documents.add_chunk_embeddings')
+
+    config = dict(app.config, CHUNK_WINDOW_TOKENS=10, CHUNK_OVERLAP_TOKENS=0,
+                  CHUNK_BATCH_SIZE=3, CHUNK_MAX_PER_DOCUMENT=7, CHUNK_TEXT_BLOCK_CHARS=64)
+    stream = BytesIO(" ".join(f"w{i}" for i in range(500)).encode('utf-8'))
+
+    with app.app_context():
+        from app import get_conn
+        conn = get_conn()
+        count = index_document(conn, 4242, stream, 'libro.md', config)
+        stored = conn.execute("SELECT COUNT(*) FROM recursos_chunks WHERE recurso_id = 4242").fetchone()[0]
+        conn.execute("DELETE FROM recursos_chunks WHERE recurso_id = 4242")
+        conn.commit()
+        conn.close()
+
+    assert count == 7
+    assert stored == 7
+    assert [len(call.args[0]) for call in embedder.call_args_list] == [3, 3, 1]
+    assert [call.args[1] for call in add_chunks.call_args_list] == [0, 3, 6]
+
+def test_index_document_does_not_hold_the_write_lock_while_embedding(app, mocker):
+    """
+    Tests that chunk batches are committed one by one and before their
+    vectors reach the index, so other connections can write while the model
+    runs and never see index vectors without their rows.
+    """
+    import sqlite3
+    from app.documents import index_document
+
+    db_path = app.config['DATABASE_URL']
+    seen = []
+    def embed(ventanas):
+        # Runs while indexing: another connection must be able to write at once.
+        other = sqlite3.connect(db_path, timeout=0)
+        other.execute("INSERT INTO recursos (titulo) VALUES ('Subida concurrente')")
+        other.commit()
+        seen.append(other.execute("SELECT COUNT(*) FROM recursos_chunks WHERE recurso_id = 4343").fetchone()[0])
+        other.close()
+        return np.ones((len(ventanas), 4), dtype=np.float32)
+
+    mocker.patch('app.documents.tokenizar', side_effect=lambda texto: texto.split())
+    mocker.patch('app.documents.generar_embeddings_ventanas', side_effect=embed)
+    rows_at_upsert = []
+    mocker.patch('app.documents.add_chunk_embeddings', side_effect=lambda rid, first, embs: rows_at_upsert.append(
+        sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM recursos_chunks WHERE recurso_id = ?", (rid,)).fetchone()[0]))
+
+    config = dict(app.config, CHUNK_WINDOW_TOKENS=10, CHUNK_OVERLAP_TOKENS=0,
+                  CHUNK_BATCH_SIZE=2, CHUNK_MAX_PER_DOCUMENT=6, CHUNK_TEXT_BLOCK_CHARS=64)
+    conn = sqlite3.connect(db_path)
+    assert index_document(conn, 4343, BytesIO(" ".join(f"w{i}" for i in range(60)).encode('utf-8')),
+                          'libro.md', config) == 6
+    conn.execute("DELETE FROM recursos_chunks WHERE recurso_id = 4343")
+    conn.commit()
+    conn.close()
+
+    assert seen == [0, 2, 4]
+    assert rows_at_upsert == [2, 4, 6]
+
+def test_uploaded_document_is_indexed_in_background(client, app, mocker):
+    """
+    Tests that /nuevo hands the uploaded document to the background indexer,
+    which stores its chunks and records the resource in the change log.
+    """
+    import sqlite3
+    from app.documents import document_indexer
+    from app.vector_db import iter_chunk_ids
+
+    mocker.patch('app.routes.resources.upload_to_ipfs', return_value=('cid_doc', 'https://cid_doc.ipfs.w3s.link/apuntes.txt'))
+    submit = mocker.spy(document_indexer, 'submit')
+    client.post('/register', data={'email': 'indexer@alumno.buap.mx', 'password': 'PasswordIndexer123!'})
+    client.post('/login', data={'email': 'indexer@alumno.buap.mx', 'password': 'PasswordIndexer123!'})
+
+    texto = " ".join(f"palabra{i}" for i in range(600)).encode('utf-8')
+    response = client.post('/nuevo', data={'titulo': 'Apuntes', 'descripcion': 'Notas de clase.',
+                                           'archivo': (BytesIO(texto), 'apuntes.txt')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert submit.call_count == 1
+
+    resource_id = submit.call_args.args[0]
+    document_indexer.wait(timeout=10)
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    stored = conn.execute("SELECT COUNT(*) FROM recursos_chunks WHERE recurso_id = ?", (resource_id,)).fetchone()[0]
+    assert stored > 0
+    # Log entries for the insert, the vector and the finished indexing.
+    logged = conn.execute("SELECT COUNT(*) FROM recursos_cambios WHERE recurso_id = ?", (resource_id,)).fetchone()[0]
+    assert logged == 3
+    conn.close()
+    indexed = [i for page in iter_chunk_ids() for i in page if i.startswith(f"{resource_id}:")]
+    assert len(indexed) == stored
+
+
+# --- Near-Duplicate Detection Tests ---
+
+def test_duplicate_groups_from_blocked_pairs():
+    """Tests that blocked pair search plus union-find recovers chains of near-duplicates."""
+    from app.duplicates import iter_duplicate_pairs, group_duplicates
+
+    rng = np.random.default_rng(1)
+    base = rng.standard_normal((6, 32)).astype(np.float32)
+    # Rows 6 and 7 are noisy copies of row 1; row 8 is a copy of row 4.
+    matrix = np.vstack([base, base[1] + 0.01, base[1] - 0.01, base[4] * 1.001])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    pairs = list(iter_duplicate_pairs(matrix, threshold=0.99, block_size=4))
+    assert all(i < j for i, j, _ in pairs)
+    groups = sorted(group_duplicates(len(matrix), pairs))
+    assert groups == [[1, 6, 7], [4, 8]]
+
+def test_new_resource_flagged_as_near_duplicate(client, mocker):
+    """Tests that ingestion links a resource to its near-duplicate and shows it in the listing."""
+    fake_embedding = np.random.rand(768).astype(np.float32)
+    mocker.patch('app.routes.resources.generar_embedding', return_value=fake_embedding)
+    mocker.patch('app.routes.resources.clasificar_texto', return_value='historia')
+    mocker.patch('app.routes.resources.add_embedding_to_chroma', return_value=None)
+    mocker.patch('app.neighbors.query_similar', return_value=([], []))
+
+    client.post('/register', data={'email': 'dup@alumno.buap.mx', 'password': 'PasswordDuplicado123!'})
+    client.post('/login', data={'email': 'dup@alumno.buap.mx', 'password': 'PasswordDuplicado123!'})
+
+    mocker.patch('app.duplicates.query_nearest', return_value=(None, 0.0))
+    client.post('/nuevo', data={'titulo': 'Revolución Mexicana', 'descripcion': '1910-1920.'})
+
+    with client.application.app_context():
+        from app import get_conn
+        conn = get_conn()
+        original_id = conn.execute("SELECT MAX(id) FROM recursos").fetchone()[0]
+        conn.close()
+
+    mocker.patch('app.duplicates.query_nearest', return_value=(str(original_id), 0.995))
+    response = client.post('/nuevo', data={'titulo': 'La Revolución Mexicana (copia)', 'descripcion': '1910-1920.'},
+                           follow_redirects=True)
+    assert "Parece un duplicado de «Revolución Mexicana»".encode('utf-8') in response.data
+    assert b"Posible duplicado" in response.data
+
+    with client.application.app_context():
+        conn = get_conn()
+        link = conn.execute("SELECT duplicado_de FROM recursos_duplicados ORDER BY recurso_id DESC").fetchone()
+        conn.close()
+    assert link['duplicado_de'] == original_id
+
+
+# --- Batch Reclassification Tests ---
+
+def test_reclassify_is_batched_and_resumable(app, mocker, tmp_path):
+    """
+    Tests that the reclassification job only picks unclassified resources,
+    writes them back in batches and resumes after an interruption.
+    """
+    import sqlite3
+    import pytest
+    import reclassify
+
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    conn.execute("DELETE FROM recursos")
+    conn.executemany("INSERT INTO recursos (titulo, descripcion, categoria) VALUES (?, ?, ?)",
+                     [(f"Recurso {i}", "", "Sin clasificar" if i % 2 else "arte") for i in range(10)])
+    conn.commit()
+
+    calls = []
+    def fake_clasificar(textos):
+        calls.append(len(textos))
+        if len(calls) == 2:
+            raise RuntimeError("interrupted")
+        return ["música"] * len(textos)
+
+    mocker.patch('reclassify.clasificar_lote', side_effect=fake_clasificar)
+    mocker.patch('reclassify.update_metadatas')
+    checkpoint = str(tmp_path / 'reclassify.checkpoint')
+
+    with pytest.raises(RuntimeError):
+        reclassify.reclassify(conn, batch_size=2, checkpoint=checkpoint)
+    assert reclassify.load_checkpoint(checkpoint, False) > 0
+
+    count = reclassify.reclassify(conn, batch_size=2, checkpoint=checkpoint)
+    assert count == 3
+    assert calls == [2, 2, 2, 1]
+    categorias = [r[0] for r in conn.execute("SELECT categoria FROM recursos ORDER BY id")]
+    assert categorias == ["arte", "música"] * 5
+    conn.close()
+
+def test_reclassify_all_keeps_manual_categories_and_metadata(app, mocker, tmp_path):
+    """
+    Tests that --all leaves categories chosen by hand alone unless they are
+    explicitly included, and that the index metadata is merged, not replaced.
+    """
+    import sqlite3
+    import reclassify
+    from app import vector_db
+
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    conn.execute("DELETE FROM recursos")
+    conn.executemany("INSERT INTO recursos (id, titulo, categoria, categoria_manual) VALUES (?, ?, ?, ?)",
+                     [(1, "Manual", "arte", 1), (2, "Automático", "arte", 0)])
+    conn.commit()
+    with app.app_context():
+        for i in (1, 2):
+            vector_db.add_embedding(i, np.ones(8, dtype=np.float32), {"titulo": f"Recurso {i}", "categoria": "arte"})
+
+    mocker.patch('reclassify.clasificar_lote', side_effect=lambda textos: ["música"] * len(textos))
+    checkpoint = str(tmp_path / 'reclassify.checkpoint')
+
+    assert reclassify.reclassify(conn, True, checkpoint=checkpoint) == 1
+    rows = conn.execute("SELECT categoria, categoria_manual FROM recursos ORDER BY id").fetchall()
+    assert rows == [("arte", 1), ("música", 0)]
+    metadata = vector_db.get_collection().get(ids=["2"], include=["metadatas"])['metadatas'][0]
+    assert metadata == {"titulo": "Recurso 2", "categoria": "música"}
+
+    assert reclassify.reclassify(conn, True, checkpoint=checkpoint, include_manual=True) == 2
+    rows = conn.execute("SELECT categoria, categoria_manual FROM recursos ORDER BY id").fetchall()
+    assert rows == [("música", 0), ("música", 0)]
+    conn.close()
+
+
+# --- SQLite / ChromaDB Reconciliation Tests ---
+
+def test_reconcile_backfills_and_deletes_only_the_drift(app, mocker):
+    """Tests that the reconciler repairs only the IDs that differ between the stores."""
+    import sqlite3
+    import reconcile_chroma
+    from app.nlp_utils import embedding_to_blob
+
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    conn.execute("DELETE FROM recursos")
+    blob = embedding_to_blob(np.ones(8, dtype=np.float32))
+    conn.executemany("INSERT INTO recursos (id, titulo, categoria, embedding) VALUES (?, ?, ?, ?)",
+                     [(i, f"Recurso {i}", "arte", blob) for i in range(1, 8)])
+    conn.commit()
+
+    # The index is missing resources 2 and 5 and still has deleted resource 42.
+    index = {str(i) for i in [1, 3, 4, 6, 7, 42]}
+    mocker.patch('reconcile_chroma.count_embeddings', side_effect=lambda: len(index))
+    mocker.patch('reconcile_chroma.get_existing_ids', side_effect=lambda ids: {str(i) for i in ids} & index)
+    mocker.patch('reconcile_chroma.iter_index_ids',
+                 side_effect=lambda size: iter([sorted(index)[i:i + size] for i in range(0, len(index), size)]))
+    added = mocker.patch('reconcile_chroma.add_embeddings',
+                         side_effect=lambda ids, embs, metas: index.update(str(i) for i in ids))
+    deleted = mocker.patch('reconcile_chroma.delete_embeddings',
+                           side_effect=lambda ids: index.difference_update(ids))
+
+    report = reconcile_chroma.reconcile(conn, chunk_size=3, dry_run=True)
+    assert (report['missing'], report['orphans']) == (2, 1)
+    added.assert_not_called()
+
+    report = reconcile_chroma.reconcile(conn, chunk_size=3)
+    assert [call.args[0] for call in added.call_args_list] == [[2], [5]]
+    assert deleted.call_args.args[0] == ['42']
+    assert index == {str(i) for i in range(1, 8)}
+
+    report = reconcile_chroma.reconcile(conn, chunk_size=3)
+    assert report['drift'] == 0
+    conn.close()
+
+def test_reconcile_repairs_the_chunk_collection(app):
+    """
+    Tests that the reconciler backfills stored chunks missing from the index,
+    removes the chunks of deleted resources and the chunks with no row in
+    recursos_chunks, and logs the affected resources.
+    """
+    import sqlite3
+    import reconcile_chroma
+    from app.nlp_utils import embedding_to_blob
+    from app.search_cache import catalogue_version
+    from app.vector_db import add_chunk_embeddings, iter_chunk_ids, configure
+
+    configure('memory')
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    conn.execute("DELETE FROM recursos")
+    conn.execute("DELETE FROM recursos_chunks")
+    conn.execute("INSERT INTO recursos (id, titulo) VALUES (1, 'Con fragmentos')")
+    blob = embedding_to_blob(np.ones(8, dtype=np.float32))
+    # Resource 1 has chunks 0, 1 and 3 in SQLite; resource 9 was deleted but its row is left.
+    conn.executemany("INSERT INTO recursos_chunks (recurso_id, chunk_index, embedding) VALUES (?, ?, ?)",
+                     [(1, 0, blob), (1, 1, blob), (1, 3, blob), (9, 0, blob)])
+    conn.commit()
+    # The index lacks chunk 3 of 1 and has a chunk 2 without a row and a chunk of 9.
+    add_chunk_embeddings(1, 0, np.ones((3, 8), dtype=np.float32))
+    add_chunk_embeddings(9, 0, np.ones((1, 8), dtype=np.float32))
+
+    report = reconcile_chroma.reconcile(conn, chunk_size=2, dry_run=True)
+    assert (report['missing_chunks'], report['orphan_chunks']) == (1, 2)
+
+    version = catalogue_version(conn)
+    report = reconcile_chroma.reconcile(conn, chunk_size=2)
+    assert (report['missing_chunks'], report['orphan_chunks']) == (1, 2)
+    assert sorted(i for page in iter_chunk_ids() for i in page) == ["1:0", "1:1", "1:3"]
+    assert catalogue_version(conn) > version
+    report = reconcile_chroma.reconcile(conn, chunk_size=2)
+    assert (report['missing_chunks'], report['orphan_chunks']) == (0, 0)
+    conn.close()
+
+
+# --- Outbound HTTP Client Tests ---
+
+def test_upload_to_ipfs_against_stub_pinning_service(app, mocker):
+    """Tests the IPFS upload through the shared client against a local stub pinning service."""
+    import httpx
+    from app.http_client import AsyncHttpClient, SyncHttpClient
+    from app.ipfs_client import upload_to_ipfs
+
+    received = {}
+    def pinning_service(request):
+        received['url'] = str(request.url)
+        received['auth'] = request.headers['Authorization']
+        received['body'] = request.read()
+        return httpx.Response(200, json={"cid": "bafystub"})
+
+    client = SyncHttpClient(AsyncHttpClient(transport=httpx.MockTransport(pinning_service)))
+    mocker.patch('app.ipfs_client.http_client', client)
+    mocker.patch.dict(app.config, {'WEB3_STORAGE_TOKEN': 'token-de-prueba',
+                                   'IPFS_UPLOAD_URL': 'http://pin.local/upload',
+                                   'IPFS_GATEWAY_URL': 'http://gateway.local/ipfs/{cid}/{filename}'})
+
+    with app.app_context():
+        cid, url = upload_to_ipfs(BytesIO(b"contenido del apunte"), 'apunte.txt')
+
+    assert (cid, url) == ('bafystub', 'http://gateway.local/ipfs/bafystub/apunte.txt')
+    assert received['url'] == 'http://pin.local/upload'
+    assert received['auth'] == 'Bearer token-de-prueba'
+    assert b"contenido del apunte" in received['body']
+
+def test_http_client_caps_concurrency_and_breaks_circuit():
+    """
+    Tests that requests to one service never exceed the per-host cap and that
+    a failing service opens the circuit so later requests fail fast.
+    """
+    import asyncio
+    import httpx
+    import pytest
+    from app.http_client import AsyncHttpClient, CircuitOpenError
+
+    state = {'active': 0, 'peak': 0, 'calls': 0}
+    async def gateway(request):
+        state['calls'] += 1
+        state['active'] += 1
+        state['peak'] = max(state['peak'], state['active'])
+        await asyncio.sleep(0.01)
+        state['active'] -= 1
+        return httpx.Response(503 if request.url.path == '/down' else 200)
+
+    async def scenario():
+        client = AsyncHttpClient(per_host_limit=3, failure_threshold=2, reset_timeout=60,
+                                 transport=httpx.MockTransport(gateway))
+        responses = await asyncio.gather(*(client.request('HEAD', f'http://gw.local/{i}') for i in range(12)))
+        assert all(r.status_code == 200 for r in responses)
+        assert state['peak'] == 3
+
+        for _ in range(2):
+            await client.request('GET', 'http://down.local/down')
+        calls = state['calls']
+        with pytest.raises(CircuitOpenError):
+            await client.request('GET', 'http://down.local/down')
+        assert state['calls'] == calls
+        # Other services are not affected by the open circuit.
+        assert (await client.request('GET', 'http://gw.local/ok')).status_code == 200
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_circuit_closes_after_client_error_on_trial(tmp_path):
+    """
+    Tests that a 4xx on the half-open trial request counts as a success of
+    the service, so the circuit does not stay open forever.
+    """
+    import asyncio
+    import httpx
+    import pytest
+    from app.http_client import AsyncHttpClient
+
+    async def gateway(request):
+        status = {'/down': 503, '/missing': 404}.get(request.url.path, 200)
+        return httpx.Response(status, content=b'contenido')
+
+    async def scenario():
+        client = AsyncHttpClient(failure_threshold=1, reset_timeout=0, transport=httpx.MockTransport(gateway))
+        await client.request('GET', 'http://gw.local/down')
+        assert client.breaker('gw.local').is_open
+
+        with open(tmp_path / 'trial', 'wb') as f, pytest.raises(httpx.HTTPStatusError):
+            await client.download('http://gw.local/missing', f)
+        assert not client.breaker('gw.local').is_open
+        with open(tmp_path / 'ok', 'wb') as f:
+            assert await client.download('http://gw.local/ok', f) == len(b'contenido')
+
+        # A failure while writing the file also ends the trial (as a failure).
+        await client.request('GET', 'http://gw.local/down')
+        class BrokenFile:
+            def write(self, data):
+                raise OSError("disco lleno")
+        with pytest.raises(OSError):
+            await client.download('http://gw.local/ok', BrokenFile())
+        assert (await client.request('GET', 'http://gw.local/ok')).status_code == 200
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+# --- IPFS Gateway Cache Tests ---
+
+def test_ipfs_proxy_serves_from_disk_cache(client, mocker, tmp_path):
+    """
+    Tests that resource files are fetched from the gateway once, then served
+    from the local cache, including Range requests.
+    """
+    import httpx
+    from app.http_client import AsyncHttpClient, SyncHttpClient
+    from app.gateway_cache import gateway_cache
+
+    contenido = b"0123456789" * 100
+    fetches = []
+    def gateway(request):
+        fetches.append(str(request.url))
+        return httpx.Response(200, content=contenido)
+
+    mocker.patch('app.routes.ipfs.http_client', SyncHttpClient(AsyncHttpClient(transport=httpx.MockTransport(gateway))))
+    gateway_cache.configure(str(tmp_path / 'ipfs_cache'), 10 * 1024)
+
+    client.post('/register', data={'email': 'reader@alumno.buap.mx', 'password': 'PasswordReader123!'})
+    client.post('/login', data={'email': 'reader@alumno.buap.mx', 'password': 'PasswordReader123!'})
+    with client.application.app_context():
+        from app import get_conn
+        conn = get_conn()
+        conn.execute("INSERT INTO recursos (titulo, cid, filename) VALUES ('Apunte', 'bafycache', 'apunte.txt')")
+        conn.commit()
+        conn.close()
+
+    response = client.get('/ipfs/bafycache/apunte.txt')
+    assert response.status_code == 200
+    assert response.data == contenido
+    assert fetches == ['https://bafycache.ipfs.w3s.link/apunte.txt']
+
+    partial = client.get('/ipfs/bafycache/apunte.txt', headers={'Range': 'bytes=10-19'})
+    assert partial.status_code == 206
+    assert partial.data == b"0123456789"
+    assert len(fetches) == 1
+
+    stats = gateway_cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['bytes_saved'] == len(contenido)
+
+    # A file evicted right after the lookup is fetched again instead of failing.
+    real_get_or_fetch = gateway_cache.get_or_fetch
+    def evicted_once(cid, filename, fetch):
+        path = real_get_or_fetch(cid, filename, fetch)
+        if len(fetches) == 1:
+            os.remove(path)
+        return path
+    mocker.patch.object(gateway_cache, 'get_or_fetch', side_effect=evicted_once)
+    response = client.get('/ipfs/bafycache/apunte.txt')
+    assert response.status_code == 200
+    assert response.data == contenido
+    assert len(fetches) == 2
+
+    # Only files of known resources are proxied.
+    assert client.get('/ipfs/bafyunknown/apunte.txt').status_code == 404
+
+def test_gateway_cache_evicts_least_recently_used(tmp_path):
+    """Tests that the cache stays under its size limit by evicting the LRU file."""
+    from app.gateway_cache import GatewayCache
+
+    cache = GatewayCache(str(tmp_path), max_bytes=250)
+    write = lambda data: (lambda f: f.write(data))
+    cache.get_or_fetch('bafya', 'a.txt', write(b"a" * 100))
+    cache.get_or_fetch('bafyb', 'b.txt', write(b"b" * 100))
+    cache.get_or_fetch('bafya', 'a.txt', write(b"never fetched"))
+    cache.get_or_fetch('bafyc', 'c.txt', write(b"c" * 100))
+
+    stats = cache.stats()
+    assert stats['size_bytes'] == 200
+    assert (stats['hits'], stats['misses']) == (1, 3)
+    assert os.path.exists(cache.path(cache.key('bafya', 'a.txt')))
+    assert not os.path.exists(cache.path(cache.key('bafyb', 'b.txt')))
+
+def test_gateway_cache_registers_entry_before_releasing_fetch_lock(tmp_path):
+    """Tests that a finished download is visible as a hit before other requests can start fetching it."""
+    from app.gateway_cache import GatewayCache
+
+    cache = GatewayCache(str(tmp_path), max_bytes=1024)
+    seen = []
+    class FetchLocks(dict):
+        def pop(self, key, default=None):
+            seen.append(key in cache._entries)
+            return super().pop(key, default)
+    cache._fetch_locks = FetchLocks()
+
+    cache.get_or_fetch('bafya', 'a.txt', lambda f: f.write(b"a" * 10))
+    assert seen == [True]
+
+def test_gateway_cache_keeps_no_fetch_locks_for_hits(tmp_path):
+    """Tests that per-file fetch locks only exist while a miss is being fetched."""
+    from app.gateway_cache import GatewayCache
+
+    cache = GatewayCache(str(tmp_path), max_bytes=1024 ** 2)
+    for i in range(50):
+        cache.get_or_fetch(f'bafy{i}', 'a.txt', lambda f: f.write(b"x" * 10))
+        cache.get_or_fetch(f'bafy{i}', 'a.txt', lambda f: f.write(b"never fetched"))
+    assert (cache.hits, cache.misses) == (50, 50)
+    assert len(cache._fetch_locks) == 0
+
+def test_gateway_cache_limit_covers_all_workers(tmp_path):
+    """Tests that workers sharing the cache directory stay under one limit together."""
+    from app.gateway_cache import GatewayCache
+
+    worker_a = GatewayCache(str(tmp_path), max_bytes=250)
+    worker_b = GatewayCache(str(tmp_path), max_bytes=250)
+    worker_a.get_or_fetch('bafya', 'a.txt', lambda f: f.write(b"a" * 100))
+    worker_b.get_or_fetch('bafyb', 'b.txt', lambda f: f.write(b"b" * 100))
+    # A file cached by the other worker is a hit, not a second download.
+    worker_a.get_or_fetch('bafyb', 'b.txt', lambda f: f.write(b"never fetched"))
+    worker_a.get_or_fetch('bafyc', 'c.txt', lambda f: f.write(b"c" * 100))
+
+    on_disk = sum(f.stat().st_size for f in tmp_path.rglob('*') if f.is_file())
+    assert on_disk == 200
+    assert worker_a.hits == 1
+    assert not os.path.exists(worker_a.path(worker_a.key('bafya', 'a.txt')))
+
+
+# --- Password Hashing and Rate Limiting Tests ---
+
+def test_login_rehashes_outdated_password_hash(client):
+    """Tests that a hash made with an older method is upgraded on a successful login."""
+    from werkzeug.security import generate_password_hash
+    from app import get_conn
+
+    with client.application.app_context():
+        conn = get_conn()
+        conn.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)",
+                     ('legacy@alumno.buap.mx', generate_password_hash('PasswordLegacy123!', method='pbkdf2:sha256:1000')))
+        conn.commit()
+        conn.close()
+
+    response = client.post('/login', data={'email': 'legacy@alumno.buap.mx', 'password': 'PasswordLegacy123!'},
+                           follow_redirects=True)
+    assert b"Bienvenido," in response.data
+
+    with client.application.app_context():
+        conn = get_conn()
+        stored = conn.execute("SELECT password_hash FROM usuarios WHERE email = 'legacy@alumno.buap.mx'").fetchone()[0]
+        conn.close()
+    assert stored.startswith('scrypt:')
+
+    # The upgraded hash still works.
+    client.get('/logout')
+    response = client.post('/login', data={'email': 'legacy@alumno.buap.mx', 'password': 'PasswordLegacy123!'},
+                           follow_redirects=True)
+    assert b"Bienvenido," in response.data
+
+def test_login_succeeds_when_rehash_pool_is_busy(client, mocker):
+    """Tests that a verified login is not refused when upgrading its hash finds the pool busy."""
+    from werkzeug.security import generate_password_hash
+    from app import get_conn
+    from app.security import password_hasher, HasherBusyError
+
+    old_hash = generate_password_hash('PasswordBusy123!', method='pbkdf2:sha256:1000')
+    with client.application.app_context():
+        conn = get_conn()
+        conn.execute("INSERT INTO usuarios (email, password_hash) VALUES (?, ?)", ('busy@alumno.buap.mx', old_hash))
+        conn.commit()
+        conn.close()
+
+    mocker.patch.object(password_hasher, 'hash', side_effect=HasherBusyError("ocupado"))
+    response = client.post('/login', data={'email': 'busy@alumno.buap.mx', 'password': 'PasswordBusy123!'},
+                           follow_redirects=True)
+    assert response.status_code == 200
+    assert b"Bienvenido," in response.data
+
+    with client.application.app_context():
+        conn = get_conn()
+        stored = conn.execute("SELECT password_hash FROM usuarios WHERE email = 'busy@alumno.buap.mx'").fetchone()[0]
+        conn.close()
+    assert stored == old_hash
+    client.get('/logout')
+
+def test_rate_limit_uses_client_address_behind_proxy(app, mocker):
+    """Tests that with TRUSTED_PROXIES the login limiter is keyed on the forwarded client address."""
+    from app import create_app
+    from app.security import login_limiter
+    from config import TestingConfig
+
+    class ProxiedConfig(TestingConfig):
+        TRUSTED_PROXIES = 1
+
+    proxied_app, _ = create_app(config_class=ProxiedConfig)
+    allow = mocker.spy(login_limiter, 'allow')
+    proxied_app.test_client().post('/login', data={'email': 'x@alumno.buap.mx', 'password': 'x'},
+                                   headers={'X-Forwarded-For': '203.0.113.7'},
+                                   environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    app.test_client().post('/login', data={'email': 'x@alumno.buap.mx', 'password': 'x'},
+                           headers={'X-Forwarded-For': '203.0.113.7'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    # Without trusted proxies the header is ignored (it could be forged).
+    assert [call.args[0] for call in allow.call_args_list] == ['203.0.113.7', '10.0.0.1']
+
+def test_password_hasher_timeout_is_busy_error():
+    """Tests that a hash that does not finish in time is reported as busy instead of a 500."""
+    import time
+    import pytest
+    from app.security import PasswordHasher, HasherBusyError
+
+    hasher = PasswordHasher(workers=1, timeout=0.05)
+    with pytest.raises(HasherBusyError):
+        hasher._submit(time.sleep, 0.5)
+
+def test_login_is_rate_limited_per_email(client, mocker):
+    """Tests that repeated login attempts for one email are refused with 429."""
+    from app.security import LoginRateLimiter, RateLimiter
+
+    limiter = LoginRateLimiter()
+    limiter.by_ip = RateLimiter(100, 60)
+    limiter.by_email = RateLimiter(3, 60)
+    mocker.patch('app.routes.auth.login_limiter', limiter)
+
+    for _ in range(3):
+        response = client.post('/login', data={'email': 'victim@alumno.buap.mx', 'password': 'adivinanza'})
+        assert response.status_code == 200
+    response = client.post('/login', data={'email': 'Victim@alumno.buap.mx', 'password': 'adivinanza'})
+    assert response.status_code == 429
+    assert b"Demasiados intentos" in response.data
+
+    # Other accounts from the same address are not affected.
+    response = client.post('/login', data={'email': 'other@alumno.buap.mx', 'password': 'adivinanza'})
+    assert response.status_code == 200
+
+
+# --- Schema Migration Tests ---
+
+def _hot_queries():
+    """
+    Returns the SQL the app and its scripts run on hot paths, as
+    (sql, params, allowed plan steps), taken from the constants the code uses.
+    """
+    from app import LOAD_USER_SQL
+    from app.routes.auth import LOGIN_USER_SQL
+    from app.routes.resources import LIST_RESOURCES_SQL, DUPLICATE_ORIGINAL_SQL, RESOURCE_SQL
+    from app.routes.ipfs import KNOWN_FILE_SQL
+    from app.display_cache import FETCH_SQL, FIRST_CHANGE_SQL, CHANGES_SQL
+    from app.search_cache import CATALOGUE_VERSION_SQL
+    from app.neighbors import EMBEDDINGS_PAGE_SQL, NEIGHBORS_SQL
+    from reclassify import batch_query
+    from catalogo import EXPORT_PAGE_SQL, EXISTING_CIDS_SQL, FIELDS
+    from check_cids import CIDS_PAGE_SQL
+    from compact_embeddings import CHUNKS_PAGE_SQL
+    from reconcile_chroma import INDEXED_PAGE_SQL, BACKFILL_SQL, KNOWN_IDS_SQL, KNOWN_CHUNKS_SQL
+    from reconcile_chroma import CHUNK_KEYS_PAGE_SQL, CHUNK_EMBEDDING_SQL
+
+    three = ', '.join('?' for _ in range(3))
+    queries = [
+        # The listing shows the whole catalogue, so it walks `recursos` in ID
+        # order; the duplicate group must still be a lookup per row.
+        (LIST_RESOURCES_SQL, (), ('SCAN r',)),
+        (DUPLICATE_ORIGINAL_SQL, (1,), ()),
+        (RESOURCE_SQL, (1,), ()),
+        (LOGIN_USER_SQL, ('a@alumno.buap.mx',), ()),
+        (LOAD_USER_SQL, (1,), ()),
+        (KNOWN_FILE_SQL, ('bafy', 'a.pdf'), ()),
+        (FETCH_SQL.format(placeholders=three), (1, 2, 3), ()),
+        (FIRST_CHANGE_SQL, (), ()),
+        (CHANGES_SQL, (0,), ()),
+        (CATALOGUE_VERSION_SQL, (), ()),
+        (EMBEDDINGS_PAGE_SQL, (0, 500), ()),
+        # Sorts only the few neighbors stored for one resource.
+        (NEIGHBORS_SQL, (1,), ('USE TEMP B-TREE FOR ORDER BY',)),
+        (EXPORT_PAGE_SQL.format(columns=', '.join(FIELDS)), (0, 500), ()),
+        (EXISTING_CIDS_SQL.format(placeholders=three), ('a', 'b', 'c'), ()),
+        (CIDS_PAGE_SQL, (0, 200), ()),
+        (CHUNKS_PAGE_SQL, (0, -1, 500), ()),
+        (INDEXED_PAGE_SQL, (0, 500), ()),
+        (BACKFILL_SQL.format(placeholders=three), (1, 2, 3), ()),
+        (KNOWN_IDS_SQL.format(placeholders=three), (1, 2, 3), ()),
+        (KNOWN_CHUNKS_SQL.format(placeholders=three), (1, 2, 3), ()),
+        (CHUNK_KEYS_PAGE_SQL, (0, -1, 500), ()),
+        (CHUNK_EMBEDDING_SQL, (1, 0), ()),
+    ]
+    for reclassify_all in (False, True):
+        for include_manual in (False, True):
+            sql, params = batch_query(reclassify_all, include_manual)
+            queries.append((sql, params + (0, 64), ()))
+    return queries
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    """
+    Tests that migrations bring a database created by the old init_db.py up
+    to date, record the version and are not applied twice.
+    """
+    import sqlite3
+    from app.migrations import migrate, get_version, MIGRATIONS
+
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    conn.execute("CREATE TABLE recursos (id INTEGER PRIMARY KEY AUTOINCREMENT, titulo TEXT NOT NULL, descripcion TEXT, "
+                 "categoria TEXT, enlace TEXT, cid TEXT, filename TEXT, embedding BLOB, user_id INTEGER, "
+                 "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO recursos (titulo) VALUES ('Recurso existente')")
+    conn.commit()
+
+    assert get_version(conn) == 0
+    assert migrate(conn) == MIGRATIONS[-1][0]
+    assert migrate(conn) == MIGRATIONS[-1][0]
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_recursos_cid' in indexes
+    assert conn.execute("SELECT titulo FROM recursos").fetchone()[0] == 'Recurso existente'
+    conn.close()
+
+def test_hot_queries_do_not_scan_tables(app):
+    """
+    Tests with EXPLAIN QUERY PLAN that no hot query falls back to a full
+    table scan or a temporary sort, other than the ones expected.
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    for sql, params, allowed in _hot_queries():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        costly = [step for step in plan if step.startswith(('SCAN', 'USE TEMP B-TREE')) and step not in allowed]
+        assert not costly, f"Unexpected scan or sort in {sql!r}: {plan}"
+    conn.close()
+
+
+# --- Catalogue Export / Import Tests ---
+
+def _seed_catalogue(path):
+    import sqlite3
+    from app.migrations import migrate
+    from app.nlp_utils import embedding_to_blob
+
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    vectors = np.random.default_rng(2).standard_normal((5, 8)).astype(np.float32)
+    conn.executemany(
+        "INSERT INTO recursos (titulo, descripcion, categoria, cid, filename, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Recurso {i}", "Descripción", "arte", f"bafy{i}" if i != 4 else None, f"r{i}.pdf",
+          embedding_to_blob(vectors[i], model_version='otro-campus/modelo-v1' if i == 0 else None) if i != 3 else None)
+         for i in range(5)]
+    )
+    conn.commit()
+    return conn, vectors
+
+def test_catalogue_round_trip_skips_known_cids(tmp_path, mocker):
+    """
+    Tests that an exported catalogue imports into another database with its
+    embeddings and their model tags intact, and that importing it again skips
+    resources by CID.
+    """
+    import sqlite3
+    import catalogo
+    from app.migrations import migrate
+    from app.nlp_utils import blob_to_embedding, parse_embedding_blob
+
+    source, vectors = _seed_catalogue(str(tmp_path / 'origen.db'))
+    assert catalogo.export_catalogue(source, str(tmp_path / 'catalogo.jsonl'), 'jsonl', batch_size=2) == 5
+    source.close()
+
+    target = sqlite3.connect(str(tmp_path / 'destino.db'))
+    migrate(target)
+    target.execute("INSERT INTO recursos (titulo, cid) VALUES ('Ya existente', 'bafy1')")
+    target.commit()
+    upsert = mocker.patch('catalogo.add_embeddings')
+
+    imported, skipped = catalogo.import_catalogue(target, str(tmp_path / 'catalogo.jsonl'), 'jsonl', batch_size=2)
+    assert (imported, skipped) == (4, 1)
+    # Vectors are upserted once per batch, except for the resource without embedding.
+    assert sum(len(call.args[0]) for call in upsert.call_args_list) == 3
+
+    rows = target.execute("SELECT titulo, embedding FROM recursos WHERE titulo LIKE 'Recurso %' ORDER BY titulo").fetchall()
+    assert [r[0] for r in rows] == ["Recurso 0", "Recurso 2", "Recurso 3", "Recurso 4"]
+    assert np.array_equal(blob_to_embedding(rows[0][1]), vectors[0])
+    # The vector keeps the model it was made with instead of the local one.
+    assert parse_embedding_blob(rows[0][1])[2] == 'otro-campus/modelo-v1'
+    assert parse_embedding_blob(rows[1][1])[2] != 'otro-campus/modelo-v1'
+    assert rows[2][1] is None
+
+    # Only the resource without a CID can be imported twice.
+    imported, skipped = catalogo.import_catalogue(target, str(tmp_path / 'catalogo.jsonl'), 'jsonl')
+    assert (imported, skipped) == (1, 4)
+    target.close()
+
+def test_catalogue_parquet_export(tmp_path):
+    """Tests that the Parquet export keeps the packed float32 embeddings."""
+    import pytest
+    pytest.importorskip('pyarrow')
+    import catalogo
+
+    source, vectors = _seed_catalogue(str(tmp_path / 'origen.db'))
+    catalogo.export_catalogue(source, str(tmp_path / 'catalogo.parquet'), 'parquet', batch_size=2)
+    source.close()
+
+    rows = [row for batch in catalogo.read_batches(str(tmp_path / 'catalogo.parquet'), 'parquet', 3) for row in batch]
+    assert len(rows) == 5
+    assert np.array_equal(catalogo.unpack_embedding(rows[2]['embedding']), vectors[2])
+    assert rows[0]['model_version'] == 'otro-campus/modelo-v1'
+
+
+# --- Stub Backend Tests ---
+
+def test_stub_nlp_backend_is_deterministic(app):
+    """Tests that the test configuration uses the stub backend and that its embeddings behave like the model's."""
+    from app import nlp_utils
+
+    assert isinstance(nlp_utils.get_backend(), nlp_utils.StubBackend)
+    a = nlp_utils.generar_embedding("Introducción a Python y sus listas")
+    assert a.shape == (nlp_utils.EMBEDDING_DIM,)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert np.array_equal(a, nlp_utils.generar_embedding("Introducción a Python y sus listas"))
+
+    # Texts sharing words are closer than unrelated ones.
+    related = nlp_utils.generar_embedding("Listas en Python")
+    unrelated = nlp_utils.generar_embedding("Revolución francesa")
+    assert a @ related > a @ unrelated
+
+    ventanas = nlp_utils.generar_embeddings_ventanas([nlp_utils.tokenizar("Listas en Python"), []])
+    assert np.allclose(ventanas[0], related)
+    assert nlp_utils.clasificar_texto("Ejercicios de química orgánica") == "química"
+    assert nlp_utils.clasificar_lote([]) == []
+
+def test_in_memory_vector_store(app):
+    """Tests that the in-memory store answers like Chroma: squared L2 distances, paging and upserts."""
+    from app import vector_db
+
+    collection = vector_db.get_collection()
+    assert isinstance(collection, vector_db.InMemoryCollection)
+    vector_db.delete_embeddings(list(range(1, 4)))
+    vectors = np.eye(3, dtype=np.float32)
+    vector_db.add_embeddings([1, 2, 3], list(vectors), [{"titulo": f"R{i}"} for i in range(1, 4)])
+
+    ids, scores = vector_db.query_similar(vectors[1], top_k=10)
+    assert ids == ['2', '1', '3']
+    assert scores[0] == 1.0 and np.isclose(scores[1], vector_db.distance_to_score(2.0))
+    assert vector_db.query_nearest(vectors[2]) == ('3', 1.0)
+
+    vector_db.add_embeddings([2], [vectors[0]], [{"titulo": "R2"}])
+    assert vector_db.query_similar(vectors[1], top_k=1)[1] == [vector_db.distance_to_score(2.0)]
+    assert [i for page in vector_db.iter_index_ids(page_size=2) for i in page] == ['1', '2', '3']
+    assert vector_db.get_existing_ids([1, 3, 99]) == {'1', '3'}
+    vector_db.delete_embeddings([1, 2, 3])
+    assert vector_db.count_embeddings() == 0
+
+
+# --- Compact Embedding Storage Tests ---
+
+def test_embedding_blob_formats_round_trip():
+    """Tests that every storage format is tagged and decoded, and that legacy float32 BLOBs still decode."""
+    from app.nlp_utils import embedding_to_blob, blob_to_embedding, parse_embedding_blob
+
+    rng = np.random.default_rng(0)
+    vector = rng.standard_normal(768).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+
+    sizes = {}
+    for dtype, tolerance in (('float32', 0), ('float16', 1e-3), ('int8', 1e-2)):
+        blob = embedding_to_blob(vector, dtype, 'modelo-v1')
+        decoded, stored_dtype, model_version = parse_embedding_blob(blob)
+        assert (stored_dtype, model_version) == (dtype, 'modelo-v1')
+        assert decoded.dtype == np.float32
+        assert np.abs(decoded - vector).max() <= tolerance
+        sizes[dtype] = len(blob)
+    assert sizes['int8'] < sizes['float16'] < sizes['float32']
+    assert sizes['int8'] < 768 + 32
+
+    assert np.array_equal(blob_to_embedding(vector.tobytes()), vector)
+    assert parse_embedding_blob(vector.tobytes())[1:] == ('float32', None)
+
+def test_precompute_rescores_compact_embeddings(app, mocker):
+    """Tests that neighbors computed from int8 BLOBs are rescored with the index's full-precision vectors."""
+    import sqlite3
+    from app import nlp_utils, vector_db
+    from app import neighbors as neighbors_module
+    from app.neighbors import precompute_all, get_neighbors
+
+    rng = np.random.default_rng(1)
+    base = rng.standard_normal(768).astype(np.float32)
+    # Two candidates almost equally close to resource 1, so the ranking depends on the rescoring.
+    vectors = [base, base + 0.020 * rng.standard_normal(768), base + 0.021 * rng.standard_normal(768)]
+    vectors += list(rng.standard_normal((5, 768)))
+    vectors = [(v / np.linalg.norm(v)).astype(np.float32) for v in vectors]
+
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    conn.execute("DELETE FROM recursos_similares")
+    conn.execute("DELETE FROM recursos")
+    conn.executemany("INSERT INTO recursos (id, titulo, embedding) VALUES (?, ?, ?)",
+                     [(i + 1, f"R{i + 1}", nlp_utils.embedding_to_blob(v, 'int8')) for i, v in enumerate(vectors)])
+    conn.commit()
+    vector_db.add_embeddings(list(range(1, len(vectors) + 1)), vectors, [{"titulo": "R"}] * len(vectors))
+    get_embeddings = mocker.spy(neighbors_module, 'get_embeddings')
+
+    mocker.patch('app.neighbors.get_storage_dtype', return_value='int8')
+    precompute_all(conn, k=2)
+    assert get_embeddings.called
+    expected = sorted(range(2, len(vectors) + 1), key=lambda j: -float(vectors[0] @ vectors[j - 1]))[:2]
+    neighbors = get_neighbors(conn, 1)
+    assert [sid for sid, _ in neighbors] == expected
+    assert np.isclose(neighbors[0][1], vector_db.cosine_to_score(float(vectors[0] @ vectors[expected[0] - 1])))
+
+    vector_db.delete_embeddings(list(range(1, len(vectors) + 1)))
+    conn.execute("DELETE FROM recursos_similares")
+    conn.execute("DELETE FROM recursos")
+    conn.commit()
+    conn.close()
+
+
+# --- Display Cache Tests ---
+
+def test_search_renders_from_display_cache(app, client, mocker):
+    """
+    Tests that search results are assembled from the display cache without
+    reading `recursos`, and that writes from other connections refresh it.
+    """
+    import sqlite3
+    from app.display_cache import display_cache
+
+    client.post('/register', data={'email': 'cache@alumno.buap.mx', 'password': 'PasswordSegura123!'})
+    client.post('/login', data={'email': 'cache@alumno.buap.mx', 'password': 'PasswordSegura123!'})
+    conn = sqlite3.connect(app.config['DATABASE_URL'])
+    ids = [conn.execute("INSERT INTO recursos (titulo, descripcion, categoria) VALUES (?, ?, 'arte')",
+                        (f"Cuadro {i}", "x" * 1000)).lastrowid for i in range(3)]
+    conn.commit()
+    mocker.patch('app.routes.resources._buscar_ids', return_value=([str(ids[2]), str(ids[0])], [0.9, 0.5]))
+
+    display_cache.clear()
+    misses = display_cache.misses
+    response = client.get('/buscar_semantico?q=cuadros')
+    assert response.data.index(b'Cuadro 2') < response.data.index(b'Cuadro 0')
+    assert b'x' * 301 not in response.data
+    assert display_cache.misses - misses == 2
+
+    # Another process renames a resource and deletes the other one.
+    conn.execute("UPDATE recursos SET titulo = 'Cuadro renombrado' WHERE id = ?", (ids[2],))
+    conn.execute("DELETE FROM recursos WHERE id = ?", (ids[0],))
+    conn.commit()
+    conn.close()
+
+    fetch = mocker.spy(display_cache, '_fetch')
+    response = client.get('/buscar_semantico?q=cuadros&k=6')
+    assert b'Cuadro renombrado' in response.data
+    assert b'Cuadro 0' not in response.data
+    # The cached resources that changed are read again in one query; the
+    # deleted one is then a miss that no longer exists.
+    assert [sorted(call.args[1]) for call in fetch.call_args_list] == [[ids[0], ids[2]], [ids[0]]]